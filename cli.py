@@ -5,42 +5,47 @@ Command-line interface for OpenClaw token optimization.
 """
 
 import sys
-import json
-import argparse
-from pathlib import Path
+from types import SimpleNamespace
 
-from src import __version__
+OPTIMIZE_MODES = ['full', 'routing', 'heartbeat', 'caching', 'limits']
+HEARTBEAT_PROVIDER_CHOICES = ['ollama', 'lmstudio', 'groq', 'none']
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        prog='token-optimizer',
-        description='Reduce OpenClaw AI costs by 97%',
-        epilog='For more info: https://github.com/smartpeopleconnected/openclaw-token-optimizer'
-    )
+def _sniff_subcommand(argv):
+    """Return the first positional argument (the subcommand), if any.
 
-    parser.add_argument(
-        '--no-color',
-        action='store_true',
-        help='Disable colored output'
-    )
+    Returns None when -h/--help comes first: argparse then prints the
+    top-level help, which must list every command.
+    """
+    for arg in argv:
+        if arg in ('-h', '--help'):
+            return None
+        if not arg.startswith('-'):
+            return arg
+    return None
 
-    subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
-    # Analyze command
+def _print_version():
+    from src import __version__
+    print(f"Token Optimizer v{__version__}")
+    print("Reduce OpenClaw AI costs by 97%")
+
+
+def _build_analyze(subparsers):
     subparsers.add_parser(
         'analyze',
         help='Analyze current configuration and show optimization opportunities'
     )
 
-    # Optimize command
+
+def _build_optimize(subparsers):
     optimize_parser = subparsers.add_parser(
         'optimize',
         help='Apply token optimizations'
     )
     optimize_parser.add_argument(
         '--mode',
-        choices=['full', 'routing', 'heartbeat', 'caching', 'limits'],
+        choices=OPTIMIZE_MODES,
         default='full',
         help='Optimization mode (default: full)'
     )
@@ -50,20 +55,22 @@ def main():
         help='Apply changes (default is dry-run preview)'
     )
 
-    # Verify command
+
+def _build_verify(subparsers):
     subparsers.add_parser(
         'verify',
         help='Verify optimization setup and show estimated savings'
     )
 
-    # Setup heartbeat command
+
+def _build_setup_heartbeat(subparsers):
     heartbeat_parser = subparsers.add_parser(
         'setup-heartbeat',
         help='Configure heartbeat provider (ollama, lmstudio, groq, none)'
     )
     heartbeat_parser.add_argument(
         '--provider',
-        choices=['ollama', 'lmstudio', 'groq', 'none'],
+        choices=HEARTBEAT_PROVIDER_CHOICES,
         default='ollama',
         help='Heartbeat provider (default: ollama)'
     )
@@ -74,7 +81,7 @@ def main():
     )
     heartbeat_parser.add_argument(
         '--fallback',
-        choices=['ollama', 'lmstudio', 'groq', 'none'],
+        choices=HEARTBEAT_PROVIDER_CHOICES,
         default=None,
         help='Fallback provider if primary is unavailable'
     )
@@ -84,7 +91,8 @@ def main():
         help='Apply changes (default is dry-run preview)'
     )
 
-    # Rollback command
+
+def _build_rollback(subparsers):
     rollback_parser = subparsers.add_parser(
         'rollback',
         help='Restore a previous configuration backup'
@@ -102,19 +110,140 @@ def main():
         help='Restore a specific backup file'
     )
 
-    # Health command
+
+def _build_health(subparsers):
     subparsers.add_parser(
         'health',
         help='Quick system health check'
     )
 
-    # Version command
+
+def _build_version(subparsers):
     subparsers.add_parser(
         'version',
         help='Show version information'
     )
 
-    args = parser.parse_args()
+
+# Subparser builders, in help order. Only the requested command is built.
+COMMANDS = {
+    'analyze': _build_analyze,
+    'optimize': _build_optimize,
+    'verify': _build_verify,
+    'setup-heartbeat': _build_setup_heartbeat,
+    'rollback': _build_rollback,
+    'health': _build_health,
+    'version': _build_version,
+}
+
+
+# Options understood by the fast parser: flag -> (dest, default, choices).
+# Boolean defaults mark store_true flags; everything else takes one value.
+# Must stay in sync with the builders above.
+FAST_OPTIONS = {
+    'analyze': {},
+    'optimize': {
+        '--mode': ('mode', 'full', OPTIMIZE_MODES),
+        '--apply': ('apply', False, None),
+    },
+    'verify': {},
+    'setup-heartbeat': {
+        '--provider': ('provider', 'ollama', HEARTBEAT_PROVIDER_CHOICES),
+        '--model': ('model', None, None),
+        '--fallback': ('fallback', None, HEARTBEAT_PROVIDER_CHOICES),
+        '--apply': ('apply', False, None),
+    },
+    'rollback': {
+        '--list': ('list_backups', False, None),
+        '--to': ('backup_file', None, None),
+    },
+    'health': {},
+}
+
+
+def _fast_parse(argv):
+    """Parse plain invocations without argparse.
+
+    Returns None for anything unusual (help, abbreviations, bad values) so
+    argparse can handle it and produce its usual messages.
+    """
+    no_color = False
+    while argv and argv[0] == '--no-color':
+        no_color = True
+        argv = argv[1:]
+    if not argv or argv[0] not in FAST_OPTIONS:
+        return None
+
+    command = argv[0]
+    options = FAST_OPTIONS[command]
+    values = {dest: default for dest, default, _ in options.values()}
+
+    rest = argv[1:]
+    i = 0
+    while i < len(rest):
+        spec = options.get(rest[i])
+        if spec is None:
+            return None
+        dest, default, choices = spec
+        if isinstance(default, bool):
+            values[dest] = True
+            i += 1
+            continue
+        if i + 1 >= len(rest):
+            return None
+        value = rest[i + 1]
+        if value.startswith('-') or (choices and value not in choices):
+            return None
+        values[dest] = value
+        i += 2
+
+    return SimpleNamespace(command=command, no_color=no_color, version=False, **values)
+
+
+def _build_parser(command=None):
+    """Build the argparse parser, registering only `command` when known."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='token-optimizer',
+        description='Reduce OpenClaw AI costs by 97%',
+        epilog='For more info: https://github.com/smartpeopleconnected/openclaw-token-optimizer'
+    )
+
+    parser.add_argument(
+        '--no-color',
+        action='store_true',
+        help='Disable colored output'
+    )
+    parser.add_argument(
+        '-V', '--version',
+        action='store_true',
+        help='Show version information and exit'
+    )
+
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    # Register only the chosen command; fall back to all of them for help
+    # output and error messages on unknown commands.
+    if command in COMMANDS:
+        COMMANDS[command](subparsers)
+    else:
+        for build in COMMANDS.values():
+            build(subparsers)
+
+    return parser
+
+
+def main():
+    # Fast path: answer version queries without building the parser tree
+    argv = sys.argv[1:]
+    if _sniff_subcommand(argv) == 'version' or '--version' in argv or '-V' in argv:
+        _print_version()
+        return 0
+
+    args = _fast_parse(argv)
+    if args is None:
+        args = _build_parser(_sniff_subcommand(argv)).parse_args(argv)
 
     # Apply --no-color globally
     if args.no_color:
@@ -162,6 +291,7 @@ def main():
         return 0
 
     elif args.command == 'rollback':
+        from pathlib import Path
         from src.optimizer import TokenOptimizer
         from src.colors import Colors, colorize
         optimizer = TokenOptimizer()
@@ -190,6 +320,9 @@ def main():
         return 1
 
     elif args.command == 'health':
+        import os
+        from pathlib import Path
+        from src import jsonio
         from src.colors import Colors, colorize
         from src.optimizer import resolve_heartbeat_provider, check_heartbeat_provider
 
@@ -200,9 +333,10 @@ def main():
         checks_passed = 0
         checks_total = 0
 
-        # 1. Config exists
+        # 1. Config exists (checked once, reused by the JSON check below)
+        config_exists = config_path.exists()
         checks_total += 1
-        if config_path.exists():
+        if config_exists:
             print(colorize("[PASS] Config file exists", Colors.GREEN))
             checks_passed += 1
         else:
@@ -212,13 +346,12 @@ def main():
         # 2. Valid JSON
         config = {}
         checks_total += 1
-        if config_path.exists():
+        if config_exists:
             try:
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
+                config = jsonio.loads(config_path.read_bytes())
                 print(colorize("[PASS] Config is valid JSON", Colors.GREEN))
                 checks_passed += 1
-            except (json.JSONDecodeError, IOError):
+            except (jsonio.JSONDecodeError, IOError):
                 print(colorize("[FAIL] Config is not valid JSON", Colors.RED))
         else:
             print(colorize("[SKIP] Config not found, skipping JSON check", Colors.YELLOW))
@@ -239,7 +372,8 @@ def main():
         checks_total += 1
         workspace_dir = openclaw_dir / 'workspace'
         if workspace_dir.exists():
-            total_size = sum(f.stat().st_size for f in workspace_dir.iterdir() if f.is_file())
+            with os.scandir(workspace_dir) as entries:
+                total_size = sum(e.stat().st_size for e in entries if e.is_file())
             size_kb = total_size / 1024
             if size_kb < 15:
                 print(colorize(f"[PASS] Workspace is lean ({size_kb:.1f} KB)", Colors.GREEN))
@@ -264,12 +398,11 @@ def main():
         return 0 if checks_passed == checks_total else 1
 
     elif args.command == 'version':
-        print(f"Token Optimizer v{__version__}")
-        print("Reduce OpenClaw AI costs by 97%")
+        _print_version()
         return 0
 
     else:
-        parser.print_help()
+        _build_parser().print_help()
         return 0
 
 
@@ -4,7 +4,7 @@ Token Optimizer Setup
 Package configuration for pip installation.
 """
 
-from setuptools import setup, find_packages
+from setuptools import setup
 from pathlib import Path
 import re
 
@@ -44,7 +44,8 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
         "Topic :: Office/Business :: Financial",
     ],
-    packages=find_packages(),
+    packages=["src"],
+    py_modules=["cli"],
     package_data={
         "": ["templates/*", "templates/**/*"],
     },
@@ -52,6 +53,9 @@ setup(
     python_requires=">=3.8",
     install_requires=[],
     extras_require={
+        "fast": [
+            "orjson>=3.0",
+        ],
         "dev": [
             "pytest>=7.0",
             "pytest-cov>=4.0",
@@ -3,11 +3,30 @@ Token Optimizer for OpenClaw
 Reduce AI costs by 97% through intelligent optimization.
 """
 
+import importlib
+
 __version__ = "1.0.18"
 __author__ = "TokenOptimizer"
 
-from .analyzer import OpenClawAnalyzer
-from .optimizer import TokenOptimizer
-from .verify import OptimizationVerifier
-
 __all__ = ['OpenClawAnalyzer', 'TokenOptimizer', 'OptimizationVerifier']
+
+# Public classes are resolved on first access (PEP 562) so that light CLI
+# commands like `version` don't pay for importing every submodule.
+_LAZY_IMPORTS = {
+    'OpenClawAnalyzer': '.analyzer',
+    'TokenOptimizer': '.optimizer',
+    'OptimizationVerifier': '.verify',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
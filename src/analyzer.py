@@ -4,21 +4,49 @@ Token Optimizer - Analyzer Module
 Analyzes OpenClaw configuration and estimates token usage & savings.
 """
 
-import json
 import os
 import sys
+import bisect
+import functools
+import time
 from pathlib import Path
-from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
 try:
     from src.colors import Colors, colorize
+    from src import jsonio
 except ImportError:
     from colors import Colors, colorize
+    import jsonio
+
+
+# Workspace file sizes: green under 5KB, yellow under 15KB, red otherwise
+_SIZE_THRESHOLDS = (5 * 1024, 15 * 1024)
+_SIZE_COLORS = (Colors.GREEN, Colors.YELLOW, Colors.RED)
+
+# Report status colors per section: ({status: color}, color for any other status)
+_STATUS_COLORS = {
+    'model_routing': ({'optimized': Colors.GREEN}, Colors.RED),
+    'heartbeat': ({'optimized': Colors.GREEN, 'not_configured': Colors.YELLOW}, Colors.RED),
+    'session_management': ({'optimized': Colors.GREEN, 'no_workspace_files': Colors.YELLOW}, Colors.RED),
+    'caching': ({'optimized': Colors.GREEN}, Colors.RED),
+    'rate_limits': ({'configured': Colors.GREEN}, Colors.YELLOW),
+}
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_config_cached(path_str: str, mtime_ns: int, size: int) -> Dict:
+    """Parse a config file once per (path, mtime, size); treat result as read-only."""
+    with open(path_str, 'rb') as f:
+        return jsonio.loads(f.read())
+
 
 class OpenClawAnalyzer:
     """Analyzes OpenClaw configuration for token optimization opportunities."""
 
+    __slots__ = ('config_path', 'config', '_defaults', 'workspace_files',
+                 'issues', 'optimizations')
+
     # Cost per 1K tokens (approximate)
     COSTS = {
         'sonnet': 0.003,
@@ -36,55 +64,123 @@ class OpenClawAnalyzer:
         'avg_messages_per_day': 100, # Average API calls
     }
 
+    # Model tiers matched against model ids, in priority order
+    _MODEL_TIERS = ('haiku', 'sonnet', 'opus')
+
+    # Monthly figures derived once from the tables above (30-day month)
+    _AVG_CALL_TOKENS = 2000          # Tokens per API call
+    _CACHED_PROMPT_TOKENS = 5000     # 5KB typical agent prompt
+    _MONTHLY_CALL_KTOKENS = ESTIMATES['avg_messages_per_day'] * _AVG_CALL_TOKENS / 1000 * 30
+    _MONTHLY_ROUTING_SAVINGS = {
+        'sonnet': _MONTHLY_CALL_KTOKENS * (COSTS['sonnet'] - COSTS['haiku']),
+        'opus': _MONTHLY_CALL_KTOKENS * (COSTS['opus'] - COSTS['haiku']),
+    }
+    # Heartbeats assume Haiku pricing at minimum
+    _MONTHLY_HEARTBEAT_COST = (ESTIMATES['heartbeats_per_day'] * ESTIMATES['heartbeat_tokens'] / 1000
+                               * COSTS['haiku'] * 30)
+    # Cost of one extra context token on every call for a month (Haiku)
+    _MONTHLY_CONTEXT_TOKEN_COST = COSTS['haiku'] / 1000 * ESTIMATES['avg_messages_per_day'] * 30
+    # Caching matters most for Sonnet; cached reads are 90% cheaper
+    _MONTHLY_CACHING_SAVINGS = (_CACHED_PROMPT_TOKENS / 1000 * COSTS['sonnet']
+                                * ESTIMATES['avg_messages_per_day'] * 0.9 * 30)
+
+    # Results of the config-driven analyses when no config file exists
+    _NO_CONFIG_RESULTS = {
+        'model_routing': {
+            'status': 'not_configured',
+            'default_model': 'unknown',
+            'has_haiku': False,
+            'has_sonnet': False,
+            'has_aliases': False,
+            'monthly_savings': 0
+        },
+        'heartbeat': {
+            'status': 'not_configured',
+            'provider': 'api',
+            'interval': 3600,
+            'monthly_cost': 0,
+            'monthly_savings': 0
+        },
+        'caching': {
+            'status': 'needs_optimization',
+            'enabled': False,
+            'ttl': '5m',
+            'monthly_savings': _MONTHLY_CACHING_SAVINGS
+        },
+        'rate_limits': {
+            'status': 'not_configured',
+            'has_api_limit': False,
+            'has_budget': False,
+            'daily_budget': None,
+            'monthly_budget': None
+        },
+    }
+
+    # Workspace files loaded into context, in report order
+    TARGET_FILES = ('SOUL.md', 'USER.md', 'IDENTITY.md', 'MEMORY.md',
+                    'TOOLS.md', 'REFERENCE.md', 'CONTEXT.md')
+    _TARGET_FILE_SET = frozenset(TARGET_FILES)
+
     def __init__(self):
         self.config_path = self._find_config()
         self.config = self._load_config()
+        self._defaults = self.config.get('agents', {}).get('defaults', {})
         self.workspace_files = self._scan_workspace()
         self.issues: List[Dict] = []
         self.optimizations: List[Dict] = []
 
     def _find_config(self) -> Optional[Path]:
         """Find OpenClaw configuration file."""
-        possible_paths = [
-            Path.home() / '.openclaw' / 'openclaw.json',
-            Path.home() / '.openclaw' / 'openclaw-config.json',
-            Path.home() / '.openclaw' / 'config.json',
-            Path.cwd() / '.openclaw.json',
-            Path.cwd() / 'openclaw.json',
-        ]
-
-        for path in possible_paths:
-            if path.exists():
-                return path
+        openclaw_dir = os.path.join(os.path.expanduser('~'), '.openclaw')
+        for name in ('openclaw.json', 'openclaw-config.json', 'config.json'):
+            path = os.path.join(openclaw_dir, name)
+            if os.path.exists(path):
+                return Path(path)
+
+        # cwd is only looked up when no config exists under ~/.openclaw
+        cwd = os.getcwd()
+        for name in ('.openclaw.json', 'openclaw.json'):
+            path = os.path.join(cwd, name)
+            if os.path.exists(path):
+                return Path(path)
         return None
 
     def _load_config(self) -> Dict:
         """Load OpenClaw configuration."""
-        if self.config_path and self.config_path.exists():
+        if self.config_path:
+            path_str = str(self.config_path)
             try:
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
+                st = os.stat(path_str)
+            except OSError:
+                return {}
+            try:
+                return _parse_config_cached(path_str, st.st_mtime_ns, st.st_size)
+            except jsonio.JSONDecodeError:
                 return {}
         return {}
 
     def _scan_workspace(self) -> Dict[str, int]:
         """Scan workspace files and their sizes."""
         workspace_files = {}
-        workspace_paths = [
-            Path.cwd(),
-            Path.home() / '.openclaw' / 'workspace',
-        ]
-
-        target_files = ['SOUL.md', 'USER.md', 'IDENTITY.md', 'MEMORY.md',
-                       'TOOLS.md', 'REFERENCE.md', 'CONTEXT.md']
+        workspace_paths = (
+            os.getcwd(),
+            os.path.join(os.path.expanduser('~'), '.openclaw', 'workspace'),
+        )
 
         for base_path in workspace_paths:
-            if base_path.exists():
-                for file_name in target_files:
-                    file_path = base_path / file_name
-                    if file_path.exists():
-                        workspace_files[file_name] = file_path.stat().st_size
+            # One directory read per base path; DirEntry caches the stat
+            try:
+                with os.scandir(base_path) as entries:
+                    sizes = {
+                        entry.name: entry.stat().st_size
+                        for entry in entries
+                        if entry.name in self._TARGET_FILE_SET and entry.is_file()
+                    }
+            except OSError:
+                continue
+            for file_name in self.TARGET_FILES:
+                if file_name in sizes:
+                    workspace_files[file_name] = sizes[file_name]
 
         return workspace_files
 
@@ -99,44 +195,30 @@ class OpenClawAnalyzer:
             'monthly_savings': 0
         }
 
-        agents_config = self.config.get('agents', {})
-        defaults = agents_config.get('defaults', {})
-        model_config = defaults.get('model', {})
-        models = defaults.get('models', {})
+        model_config = self._defaults.get('model', {})
+        models = self._defaults.get('models', {})
 
-        # Check primary model
-        primary = model_config.get('primary', '')
-        if 'haiku' in primary.lower():
-            result['default_model'] = 'haiku'
-            result['status'] = 'optimized'
-        elif 'sonnet' in primary.lower():
-            result['default_model'] = 'sonnet'
-            result['status'] = 'needs_optimization'
-        elif 'opus' in primary.lower():
-            result['default_model'] = 'opus'
-            result['status'] = 'needs_optimization'
+        # Check primary model (first matching tier wins)
+        primary = model_config.get('primary', '').lower()
+        for tier in self._MODEL_TIERS:
+            if tier in primary:
+                result['default_model'] = tier
+                result['status'] = 'optimized' if tier == 'haiku' else 'needs_optimization'
+                break
 
         # Check available models
-        for model_name in models:
-            if 'haiku' in model_name.lower():
+        for model_name, model_data in models.items():
+            name = model_name.lower()
+            if 'haiku' in name:
                 result['has_haiku'] = True
-            if 'sonnet' in model_name.lower():
+            if 'sonnet' in name:
                 result['has_sonnet'] = True
-            if models[model_name].get('alias'):
+            if model_data.get('alias'):
                 result['has_aliases'] = True
 
         # Calculate potential savings
         if result['status'] == 'needs_optimization':
-            daily_calls = self.ESTIMATES['avg_messages_per_day']
-            avg_tokens = 2000  # per call
-
-            if result['default_model'] == 'sonnet':
-                current_cost = (daily_calls * avg_tokens / 1000) * self.COSTS['sonnet']
-            else:  # opus
-                current_cost = (daily_calls * avg_tokens / 1000) * self.COSTS['opus']
-
-            optimized_cost = (daily_calls * avg_tokens / 1000) * self.COSTS['haiku']
-            result['monthly_savings'] = (current_cost - optimized_cost) * 30
+            result['monthly_savings'] = self._MONTHLY_ROUTING_SAVINGS[result['default_model']]
 
         return result
 
@@ -154,23 +236,16 @@ class OpenClawAnalyzer:
 
         if heartbeat_config:
             result['interval'] = heartbeat_config.get('every', '1h')
-            model = heartbeat_config.get('model', '')
+            model = heartbeat_config.get('model', '').lower()
 
-            if 'ollama' in model.lower() or 'local' in model.lower():
+            if 'ollama' in model or 'local' in model:
                 result['provider'] = 'ollama'
                 result['status'] = 'optimized'
                 result['monthly_cost'] = 0
             else:
                 result['provider'] = 'api'
                 result['status'] = 'needs_optimization'
-
-                # Calculate cost
-                heartbeats_per_day = self.ESTIMATES['heartbeats_per_day']
-                tokens_per_heartbeat = self.ESTIMATES['heartbeat_tokens']
-                cost_per_1k = self.COSTS['haiku']  # assume haiku at minimum
-
-                daily_cost = (heartbeats_per_day * tokens_per_heartbeat / 1000) * cost_per_1k
-                result['monthly_cost'] = daily_cost * 30
+                result['monthly_cost'] = self._MONTHLY_HEARTBEAT_COST
                 result['monthly_savings'] = result['monthly_cost']
         else:
             result['status'] = 'not_configured'
@@ -200,12 +275,8 @@ class OpenClawAnalyzer:
 
         # Calculate savings
         if result['status'] == 'needs_optimization':
-            daily_calls = self.ESTIMATES['avg_messages_per_day']
             excess_tokens = (result['estimated_context_size'] - result['optimized_context_size'])
-            cost_per_1k = self.COSTS['haiku']
-
-            daily_waste = (excess_tokens / 1000) * cost_per_1k * daily_calls
-            result['monthly_savings'] = daily_waste * 30
+            result['monthly_savings'] = excess_tokens * self._MONTHLY_CONTEXT_TOKEN_COST
 
         return result
 
@@ -218,9 +289,7 @@ class OpenClawAnalyzer:
             'monthly_savings': 0
         }
 
-        agents_config = self.config.get('agents', {})
-        defaults = agents_config.get('defaults', {})
-        cache_config = defaults.get('cache', {})
+        cache_config = self._defaults.get('cache', {})
 
         if cache_config.get('enabled'):
             result['enabled'] = True
@@ -229,14 +298,8 @@ class OpenClawAnalyzer:
         else:
             result['status'] = 'needs_optimization'
 
-            # Calculate potential savings (90% on cached content)
-            daily_calls = self.ESTIMATES['avg_messages_per_day']
-            prompt_size = 5000  # 5KB typical
-            cost_per_1k = self.COSTS['sonnet']  # caching matters most for sonnet
-
-            uncached_cost = (prompt_size / 1000) * cost_per_1k * daily_calls
-            cached_cost = uncached_cost * 0.1  # 90% discount
-            result['monthly_savings'] = (uncached_cost - cached_cost) * 30
+            # Potential savings (90% on cached content)
+            result['monthly_savings'] = self._MONTHLY_CACHING_SAVINGS
 
         return result
 
@@ -272,16 +335,27 @@ class OpenClawAnalyzer:
         """Run complete analysis and return results."""
         print(colorize("\n=== OpenClaw Token Optimizer - Analysis ===\n", Colors.BOLD + Colors.CYAN))
 
+        if self.config_path is None:
+            # Nothing to inspect: use the known results for an empty config
+            sections = {name: dict(section) for name, section in self._NO_CONFIG_RESULTS.items()}
+        else:
+            sections = {
+                'model_routing': self.analyze_model_routing(),
+                'heartbeat': self.analyze_heartbeat(),
+                'caching': self.analyze_caching(),
+                'rate_limits': self.analyze_rate_limits(),
+            }
+
         results = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
             'config_found': self.config_path is not None,
             'config_path': str(self.config_path) if self.config_path else None,
             'workspace_files': self.workspace_files,
-            'model_routing': self.analyze_model_routing(),
-            'heartbeat': self.analyze_heartbeat(),
+            'model_routing': sections['model_routing'],
+            'heartbeat': sections['heartbeat'],
             'session_management': self.analyze_session_management(),
-            'caching': self.analyze_caching(),
-            'rate_limits': self.analyze_rate_limits(),
+            'caching': sections['caching'],
+            'rate_limits': sections['rate_limits'],
         }
 
         # Calculate total potential savings
@@ -296,90 +370,93 @@ class OpenClawAnalyzer:
         self._print_results(results)
         return results
 
+    def _status_label(self, section: str, status: str) -> str:
+        """Colorized upper-case status for a report section."""
+        colors, fallback = _STATUS_COLORS[section]
+        return colorize(status.upper(), colors.get(status, fallback))
+
     def _print_results(self, results: Dict):
         """Print formatted analysis results."""
+        # Collect lines and emit them with a single write
+        out = []
 
         # Config status
         if results['config_found']:
-            print(colorize(f"[FOUND] Config: {results['config_path']}", Colors.GREEN))
+            out.append(colorize(f"[FOUND] Config: {results['config_path']}", Colors.GREEN))
         else:
-            print(colorize("[NOT FOUND] No OpenClaw config file detected", Colors.YELLOW))
-            print("  Run 'optimize' to create optimized configuration\n")
+            out.append(colorize("[NOT FOUND] No OpenClaw config file detected", Colors.YELLOW))
+            out.append("  Run 'optimize' to create optimized configuration\n")
 
         # Workspace files
-        print(colorize("\n--- Workspace Files ---", Colors.BOLD))
+        out.append(colorize("\n--- Workspace Files ---", Colors.BOLD))
         if results['workspace_files']:
             for name, size in results['workspace_files'].items():
-                size_kb = size / 1024
-                color = Colors.GREEN if size_kb < 5 else Colors.YELLOW if size_kb < 15 else Colors.RED
-                print(f"  {name}: {colorize(f'{size_kb:.1f}KB', color)}")
+                color = _SIZE_COLORS[bisect.bisect_right(_SIZE_THRESHOLDS, size)]
+                out.append(f"  {name}: {colorize(f'{size / 1024:.1f}KB', color)}")
         else:
-            print(colorize("  No workspace files found", Colors.YELLOW))
+            out.append(colorize("  No workspace files found", Colors.YELLOW))
 
         # Model Routing
-        print(colorize("\n--- Model Routing ---", Colors.BOLD))
+        out.append(colorize("\n--- Model Routing ---", Colors.BOLD))
         mr = results['model_routing']
-        status_color = Colors.GREEN if mr['status'] == 'optimized' else Colors.RED
-        print(f"  Status: {colorize(mr['status'].upper(), status_color)}")
-        print(f"  Default Model: {mr['default_model']}")
+        out.append(f"  Status: {self._status_label('model_routing', mr['status'])}")
+        out.append(f"  Default Model: {mr['default_model']}")
         if mr['monthly_savings'] > 0:
-            print(colorize(f"  Potential Savings: ${mr['monthly_savings']:.2f}/month", Colors.GREEN))
+            out.append(colorize(f"  Potential Savings: ${mr['monthly_savings']:.2f}/month", Colors.GREEN))
 
         # Heartbeat
-        print(colorize("\n--- Heartbeat Configuration ---", Colors.BOLD))
+        out.append(colorize("\n--- Heartbeat Configuration ---", Colors.BOLD))
         hb = results['heartbeat']
-        status_color = Colors.GREEN if hb['status'] == 'optimized' else Colors.YELLOW if hb['status'] == 'not_configured' else Colors.RED
-        print(f"  Status: {colorize(hb['status'].upper(), status_color)}")
-        print(f"  Provider: {hb['provider']}")
+        out.append(f"  Status: {self._status_label('heartbeat', hb['status'])}")
+        out.append(f"  Provider: {hb['provider']}")
         if hb['monthly_savings'] > 0:
-            print(colorize(f"  Potential Savings: ${hb['monthly_savings']:.2f}/month", Colors.GREEN))
+            out.append(colorize(f"  Potential Savings: ${hb['monthly_savings']:.2f}/month", Colors.GREEN))
 
         # Session Management
-        print(colorize("\n--- Session Management ---", Colors.BOLD))
+        out.append(colorize("\n--- Session Management ---", Colors.BOLD))
         sm = results['session_management']
-        status_color = Colors.GREEN if sm['status'] == 'optimized' else Colors.YELLOW if sm['status'] == 'no_workspace_files' else Colors.RED
-        print(f"  Status: {colorize(sm['status'].upper(), status_color)}")
-        print(f"  Estimated Context: {sm['estimated_context_size'] / 1024:.1f}KB")
+        out.append(f"  Status: {self._status_label('session_management', sm['status'])}")
+        out.append(f"  Estimated Context: {sm['estimated_context_size'] / 1024:.1f}KB")
         if sm['monthly_savings'] > 0:
-            print(colorize(f"  Potential Savings: ${sm['monthly_savings']:.2f}/month", Colors.GREEN))
+            out.append(colorize(f"  Potential Savings: ${sm['monthly_savings']:.2f}/month", Colors.GREEN))
 
         # Caching
-        print(colorize("\n--- Prompt Caching ---", Colors.BOLD))
+        out.append(colorize("\n--- Prompt Caching ---", Colors.BOLD))
         cache = results['caching']
-        status_color = Colors.GREEN if cache['status'] == 'optimized' else Colors.RED
-        print(f"  Status: {colorize(cache['status'].upper(), status_color)}")
-        print(f"  Enabled: {cache['enabled']}")
+        out.append(f"  Status: {self._status_label('caching', cache['status'])}")
+        out.append(f"  Enabled: {cache['enabled']}")
         if cache['monthly_savings'] > 0:
-            print(colorize(f"  Potential Savings: ${cache['monthly_savings']:.2f}/month", Colors.GREEN))
+            out.append(colorize(f"  Potential Savings: ${cache['monthly_savings']:.2f}/month", Colors.GREEN))
 
         # Rate Limits
-        print(colorize("\n--- Rate Limits & Budgets ---", Colors.BOLD))
+        out.append(colorize("\n--- Rate Limits & Budgets ---", Colors.BOLD))
         rl = results['rate_limits']
-        status_color = Colors.GREEN if rl['status'] == 'configured' else Colors.YELLOW
-        print(f"  Status: {colorize(rl['status'].upper(), status_color)}")
-        print(f"  API Limits: {'Yes' if rl['has_api_limit'] else 'No'}")
-        print(f"  Budgets: {'Yes' if rl['has_budget'] else 'No'}")
+        out.append(f"  Status: {self._status_label('rate_limits', rl['status'])}")
+        out.append(f"  API Limits: {'Yes' if rl['has_api_limit'] else 'No'}")
+        out.append(f"  Budgets: {'Yes' if rl['has_budget'] else 'No'}")
 
         # Total Savings
-        print(colorize("\n========================================", Colors.BOLD + Colors.CYAN))
-        print(colorize(f"TOTAL POTENTIAL SAVINGS: ${results['total_monthly_savings']:.2f}/month", Colors.BOLD + Colors.GREEN))
-        print(colorize(f"                         ${results['total_monthly_savings'] * 12:.2f}/year", Colors.GREEN))
-        print(colorize("========================================\n", Colors.BOLD + Colors.CYAN))
+        out.append(colorize("\n========================================", Colors.BOLD + Colors.CYAN))
+        out.append(colorize(f"TOTAL POTENTIAL SAVINGS: ${results['total_monthly_savings']:.2f}/month", Colors.BOLD + Colors.GREEN))
+        out.append(colorize(f"                         ${results['total_monthly_savings'] * 12:.2f}/year", Colors.GREEN))
+        out.append(colorize("========================================\n", Colors.BOLD + Colors.CYAN))
 
         # Recommendations
         if results['total_monthly_savings'] > 0:
-            print(colorize("RECOMMENDATIONS:", Colors.BOLD + Colors.YELLOW))
+            out.append(colorize("RECOMMENDATIONS:", Colors.BOLD + Colors.YELLOW))
             if mr['status'] == 'needs_optimization':
-                print("  1. Switch default model to Haiku")
+                out.append("  1. Switch default model to Haiku")
             if hb['status'] != 'optimized':
-                print("  2. Route heartbeats to Ollama (free)")
+                out.append("  2. Route heartbeats to Ollama (free)")
             if sm['status'] == 'needs_optimization':
-                print("  3. Implement session initialization rules")
+                out.append("  3. Implement session initialization rules")
             if cache['status'] != 'optimized':
-                print("  4. Enable prompt caching")
+                out.append("  4. Enable prompt caching")
             if rl['status'] != 'configured':
-                print("  5. Add rate limits and budgets")
-            print(colorize("\nRun 'token-optimizer optimize' to apply all optimizations", Colors.CYAN))
+                out.append("  5. Add rate limits and budgets")
+            out.append(colorize("\nRun 'token-optimizer optimize' to apply all optimizations", Colors.CYAN))
+
+        sys.stdout.write('\n'.join(out) + '\n')
 
 
 def main():
@@ -389,8 +466,7 @@ def main():
 
     # Save results to file
     output_path = Path.cwd() / '.token-optimizer-analysis.json'
-    with open(output_path, 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+    jsonio.dump_atomic(results, output_path, default=str)
     print(f"\nDetailed results saved to: {output_path}")
     print(colorize("\nRun 'python src/verify.py' to see your accumulated savings report.", Colors.CYAN))
 
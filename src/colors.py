@@ -21,10 +21,22 @@ class Colors:
     END = '\033[0m'
 
 
+# isatty() result for the current stdout, refreshed only if stdout is replaced
+_tty_stream = None
+_tty = False
+
+
+def _stdout_is_tty() -> bool:
+    global _tty_stream, _tty
+    stream = sys.stdout
+    if stream is not _tty_stream:
+        _tty_stream = stream
+        _tty = stream.isatty()
+    return _tty
+
+
 def colorize(text: str, color: str) -> str:
     """Apply color to text if terminal supports it and NO_COLOR is not set."""
-    if NO_COLOR:
+    if NO_COLOR or not _stdout_is_tty():
         return text
-    if sys.stdout.isatty():
-        return f"{color}{text}{Colors.END}"
-    return text
+    return f"{color}{text}{Colors.END}"
@@ -0,0 +1,74 @@
+"""
+Shared JSON helpers for Token Optimizer.
+Uses orjson when it is installed and falls back to the standard library.
+"""
+
+import json
+import os
+import stat
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+# catch this regardless of which backend is active.
+JSONDecodeError = json.JSONDecodeError
+
+# Windows opens os.open() files in text mode unless O_BINARY is given,
+# which would turn every \n into \r\n.
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, default=None) -> str:
+    """Serialize to a 2-space indented JSON string."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2, default=default)
+
+
+def write_atomic(path, data: bytes, fsync: bool = False):
+    """Write bytes to path via a temp file and os.replace.
+
+    Readers never see a partially written file, and an existing file keeps
+    its permission bits. Symlinks are resolved first so the link's target is
+    replaced rather than the link itself. Pass fsync=True to also flush the
+    data to disk before the replace, for files worth the cost (the user's
+    config).
+    """
+    path = os.path.realpath(os.fspath(path))
+    tmp_path = path + '.tmp'
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        mode = 0o666
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, mode)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def dump_atomic(obj, path, default=None):
+    """Write obj as JSON to path atomically (see write_atomic)."""
+    write_atomic(path, dumps(obj, default=default).encode('utf-8'))
@@ -0,0 +1,30 @@
+"""
+Network reachability helpers for Token Optimizer.
+"""
+
+# Seconds to wait for a provider to accept a connection. Shared by every
+# probe so health, setup and verify agree on what "reachable" means.
+PROBE_TIMEOUT = 5
+
+
+def endpoint_reachable(endpoint: str, timeout: float = PROBE_TIMEOUT) -> bool:
+    """Check that the endpoint's host accepts a TCP connection.
+
+    A bare connect is all "reachable" needs; no HTTP request or response
+    body is exchanged. The port defaults from the URL scheme.
+    """
+    # Imported on first probe so commands that never probe don't load them
+    import socket
+    from urllib.parse import urlsplit
+
+    url = urlsplit(endpoint)
+    # A scheme-less value like "localhost:1234" parses without a hostname;
+    # connecting to None would silently probe loopback port 80 instead
+    if not url.hostname:
+        return False
+    try:
+        port = url.port or (443 if url.scheme == "https" else 80)
+        socket.create_connection((url.hostname, port), timeout=timeout).close()
+    except (OSError, ValueError):
+        return False
+    return True
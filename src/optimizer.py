@@ -4,23 +4,27 @@ Token Optimizer - Main Optimization Module
 Applies token optimization configurations to OpenClaw.
 """
 
-import json
+import copy
 import os
 import sys
 import shutil
-import difflib
-import urllib.request
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
-import argparse
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 try:
     from src.colors import Colors, colorize
-    from src import __version__
+    from src import __version__, jsonio, net
 except ImportError:
     # Standalone execution fallback
     from colors import Colors, colorize
+    import jsonio
+    import net
     __version__ = "1.0.8"
 
 
@@ -52,6 +56,14 @@ HEARTBEAT_PROVIDERS = {
 }
 
 
+# "ollama" -> "ollama" etc., for models written as "<prefix>/<name>"
+_PROVIDER_BY_PREFIX = {
+    info["model_prefix"].rstrip("/"): name
+    for name, info in HEARTBEAT_PROVIDERS.items()
+    if info["model_prefix"]
+}
+
+
 def resolve_heartbeat_provider(config: Dict) -> str:
     """Resolve heartbeat provider from config, with auto-detect fallback."""
     heartbeat = config.get("heartbeat", {})
@@ -61,8 +73,14 @@ def resolve_heartbeat_provider(config: Dict) -> str:
     if provider and provider in HEARTBEAT_PROVIDERS:
         return provider
 
-    # Auto-detect from model string
+    # Auto-detect from model string: "<prefix>/<name>" as written by
+    # apply_heartbeat, else any provider name mentioned in it
     model = heartbeat.get("model", "")
+    prefix, sep, _ = model.partition("/")
+    if sep:
+        name = _PROVIDER_BY_PREFIX.get(prefix.lower())
+        if name:
+            return name
     for name in HEARTBEAT_PROVIDERS:
         if name != "none" and name in model.lower():
             return name
@@ -81,31 +99,302 @@ def check_heartbeat_provider(provider: str) -> bool:
 
     # Check if CLI tool is installed (e.g. ollama)
     cli_name = info.get("cli_name")
-    if cli_name:
-        if shutil.which(cli_name) is None:
-            return False
-        # CLI found, try reaching the HTTP endpoint too
-        endpoint = info.get("endpoint")
-        if endpoint:
-            try:
-                req = urllib.request.Request(endpoint, method="GET")
-                urllib.request.urlopen(req, timeout=5)
-                return True
-            except Exception:
-                return False
-        return True
+    if cli_name and shutil.which(cli_name) is None:
+        return False
 
-    # Try HTTP endpoint
     endpoint = info.get("endpoint")
     if endpoint:
-        try:
-            req = urllib.request.Request(endpoint, method="GET")
-            urllib.request.urlopen(req, timeout=5)
-            return True
-        except Exception:
-            return False
+        return net.endpoint_reachable(endpoint)
+    return bool(cli_name)
+
+
+# Optimized settings, one constant per section the apply_* methods install.
+# Shared across calls: always copy before handing them to a config.
+_MODEL_PRIMARY = {
+    "primary": "anthropic/claude-haiku-4-5"
+}
+
+_MODEL_ALIASES = {
+    "anthropic/claude-sonnet-4-5": {
+        "alias": "sonnet",
+        "cache": True
+    },
+    "anthropic/claude-haiku-4-5": {
+        "alias": "haiku",
+        "cache": False
+    },
+    "anthropic/claude-opus-4-5": {
+        "alias": "opus",
+        "cache": True
+    }
+}
+
+_CACHE_SETTINGS = {
+    "enabled": True,
+    "ttl": "5m",
+    "priority": "high"
+}
+
+_HEARTBEAT_SETTINGS = {
+    "every": "1h",
+    "model": "ollama/llama3.2:3b",
+    "session": "main",
+    "prompt": "Check: Any blockers, opportunities, or progress updates needed?"
+}
+
+_RATE_LIMITS = {
+    "api_calls": {
+        "min_interval_seconds": 5,
+        "web_search_interval_seconds": 10,
+        "max_searches_per_batch": 5,
+        "batch_cooldown_seconds": 120
+    }
+}
+
+_BUDGETS = {
+    "daily": 5.00,
+    "monthly": 200.00,
+    "warning_threshold": 0.75
+}
+
+_OPTIMIZED_TEMPLATE = {
+    "agents": {
+        "defaults": {
+            "model": _MODEL_PRIMARY,
+            "cache": _CACHE_SETTINGS,
+            "models": _MODEL_ALIASES
+        }
+    },
+    "heartbeat": _HEARTBEAT_SETTINGS,
+    "rate_limits": _RATE_LIMITS,
+    "budgets": _BUDGETS
+}
+
+
+# Workspace file templates
+
+# SOUL.md template
+_SOUL_MD = """# SOUL.md - Agent Core Principles
+
+## Identity
+[YOUR AGENT NAME/ROLE]
+
+## Core Principles
+1. Efficiency first - minimize token usage
+2. Quality over quantity - precise responses
+3. Proactive communication - surface blockers early
+
+## How to Operate
+- Default to Haiku for routine tasks
+- Switch to Sonnet only for: architecture, security, complex reasoning
+- Batch similar operations together
+- Use memory_search() on demand, not auto-load
+
+## Model Selection Rule
+```
+Default: Always use Haiku
+Switch to Sonnet ONLY when:
+- Architecture decisions
+- Production code review
+- Security analysis
+- Complex debugging/reasoning
+- Strategic multi-project decisions
+
+When in doubt: Try Haiku first.
+```
+
+## Rate Limits
+- 5s between API calls
+- 10s between searches
+- Max 5 searches/batch, then 2min break
+"""
+
+# USER.md template
+_USER_MD = """# USER.md - User Context
+
+## Profile
+- **Name:** [YOUR NAME]
+- **Timezone:** [YOUR TIMEZONE]
+- **Working Hours:** [YOUR HOURS]
+
+## Mission
+[WHAT YOU'RE BUILDING]
+
+## Success Metrics
+1. [METRIC 1]
+2. [METRIC 2]
+3. [METRIC 3]
+
+## Communication Preferences
+- Brief, actionable updates
+- Surface blockers immediately
+- Daily summary at end of session
+"""
+
+# IDENTITY.md template
+_IDENTITY_MD = """# IDENTITY.md - Agent Identity
+
+## Role
+[AGENT ROLE - e.g., "Technical Lead", "Research Assistant"]
+
+## Expertise
+- [DOMAIN 1]
+- [DOMAIN 2]
+- [DOMAIN 3]
+
+## Constraints
+- Stay within defined budgets
+- Follow rate limits strictly
+- Escalate uncertainty early
+"""
+
+
+# Agent prompt additions
+
+# Session initialization rule
+_SESSION_INIT_PROMPT = """## SESSION INITIALIZATION RULE
+
+On every session start:
+1. Load ONLY these files:
+   - SOUL.md
+   - USER.md
+   - IDENTITY.md
+   - memory/YYYY-MM-DD.md (if it exists)
+
+2. DO NOT auto-load:
+   - MEMORY.md
+   - Session history
+   - Prior messages
+   - Previous tool outputs
+
+3. When user asks about prior context:
+   - Use memory_search() on demand
+   - Pull only the relevant snippet with memory_get()
+   - Don't load the whole file
+
+4. Update memory/YYYY-MM-DD.md at end of session with:
+   - What you worked on
+   - Decisions made
+   - Leads generated
+   - Blockers
+   - Next steps
+
+This saves 80% on context overhead.
+"""
+
+# Model selection rule
+_MODEL_SELECTION_PROMPT = """## MODEL SELECTION RULE
+
+Default: Always use Haiku
+
+Switch to Sonnet ONLY when:
+- Architecture decisions
+- Production code review
+- Security analysis
+- Complex debugging/reasoning
+- Strategic multi-project decisions
+
+When in doubt: Try Haiku first.
+"""
 
-    return False
+# Rate limits rule
+_RATE_LIMITS_PROMPT = """## RATE LIMITS
+
+- 5 seconds minimum between API calls
+- 10 seconds between web searches
+- Max 5 searches per batch, then 2-minute break
+- Batch similar work (one request for 10 leads, not 10 requests)
+- If you hit 429 error: STOP, wait 5 minutes, retry
+
+## DAILY BUDGET: $5 (warning at 75%)
+## MONTHLY BUDGET: $200 (warning at 75%)
+"""
+
+# Combined optimization prompt
+_OPTIMIZATION_RULES_PROMPT = f"""# TOKEN OPTIMIZATION RULES
+
+Add these rules to your agent prompt:
+
+---
+
+{_SESSION_INIT_PROMPT}
+
+---
+
+{_MODEL_SELECTION_PROMPT}
+
+---
+
+{_RATE_LIMITS_PROMPT}
+
+---
+
+## IMPORTANT
+These rules work together to reduce costs by 97%.
+Do not remove or modify unless you understand the cost implications.
+"""
+
+
+# (filename, content) pairs, stripped once at import
+_WORKSPACE_TEMPLATES = tuple((name, content.strip()) for name, content in (
+    ('SOUL.md', _SOUL_MD),
+    ('USER.md', _USER_MD),
+    ('IDENTITY.md', _IDENTITY_MD),
+))
+
+_AGENT_PROMPTS = tuple((name, content.strip()) for name, content in (
+    ('session-init.md', _SESSION_INIT_PROMPT),
+    ('model-selection.md', _MODEL_SELECTION_PROMPT),
+    ('rate-limits.md', _RATE_LIMITS_PROMPT),
+    ('OPTIMIZATION-RULES.md', _OPTIMIZATION_RULES_PROMPT),
+))
+
+
+# Without O_BINARY, os.open() files are in text mode on Windows (\n -> \r\n)
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+
+
+def _write_text(path: Path, text: str):
+    """Create path with text using a single os.write, bypassing TextIOWrapper.
+
+    Raises FileExistsError if path (under any casing the filesystem treats
+    as the same name) already exists.
+    """
+    data = text.encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | _O_BINARY, 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+# Bundled templates directory, next to the src package
+_TEMPLATES_DIR = Path(__file__).parent.parent / 'templates'
+
+# Number of timestamped config backups kept in ~/.openclaw/backups
+MAX_BACKUPS = 20
+
+# Linux FICLONE ioctl: share data blocks with the source (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+
+def _clone_file(src: Path, dst: Path):
+    """Copy src to dst as a reflink where supported, else a regular copy.
+
+    Hard links are deliberately not used: OpenClaw may rewrite its config
+    in place, which would silently change every linked backup too.
+    """
+    if fcntl is not None and sys.platform.startswith('linux'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copymode(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy(src, dst)
 
 
 class TokenOptimizer:
@@ -115,20 +404,29 @@ class TokenOptimizer:
         self.dry_run = dry_run
         self.openclaw_dir = Path.home() / '.openclaw'
         self.config_path = self.openclaw_dir / 'openclaw.json'
+        # str form for the file operations on every run; Path is kept for display
+        self._config_path_str = os.fspath(self.config_path)
         self.backup_dir = self.openclaw_dir / 'backups'
-        self.templates_dir = Path(__file__).parent.parent / 'templates'
+        self.templates_dir = _TEMPLATES_DIR
+        self._made_dirs = set()
+
+    def _ensure_dir(self, path: Path):
+        """Create a directory (and parents) at most once per optimizer."""
+        if path not in self._made_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._made_dirs.add(path)
 
     def backup_config(self) -> Optional[Path]:
         """Create backup of existing configuration."""
-        if not self.config_path.exists():
+        if not os.path.exists(self._config_path_str):
             return None
 
-        self.backup_dir.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_path = self.backup_dir / f'openclaw_{timestamp}.json'
 
         if not self.dry_run:
-            shutil.copy(self.config_path, backup_path)
+            self._ensure_dir(self.backup_dir)
+            _clone_file(self.config_path, backup_path)
             print(colorize(f"[BACKUP] Config backed up to: {backup_path}", Colors.BLUE))
         else:
             print(colorize(f"[DRY-RUN] Would backup config to: {backup_path}", Colors.YELLOW))
@@ -137,114 +435,92 @@ class TokenOptimizer:
 
     def load_config(self) -> Dict:
         """Load existing config or return empty dict."""
-        if self.config_path.exists():
-            try:
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                print(colorize("[WARNING] Existing config is invalid JSON, starting fresh", Colors.YELLOW))
-        return {}
+        try:
+            with open(self._config_path_str, 'rb') as f:
+                config = jsonio.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except jsonio.JSONDecodeError:
+            print(colorize("[WARNING] Existing config is invalid JSON, starting fresh", Colors.YELLOW))
+            return {}
+        if not isinstance(config, dict):
+            print(colorize("[WARNING] Existing config is not a JSON object, starting fresh", Colors.YELLOW))
+            return {}
+        return config
+
+    def save_config(self, config: Dict, existing: Optional[Dict] = None):
+        """Save configuration to file. In dry-run mode, show a diff preview.
 
-    def save_config(self, config: Dict):
-        """Save configuration to file. In dry-run mode, show a diff preview."""
-        self.openclaw_dir.mkdir(parents=True, exist_ok=True)
+        The existing config is backed up first; nothing is written, previewed
+        or backed up when the file already holds exactly this config.
+        Callers that still hold the unmodified loaded config can pass it as
+        `existing` so the dry-run preview does not read it again.
+        """
+        text = jsonio.dumps(config)
+        data = text.encode('utf-8')
+        try:
+            with open(self._config_path_str, 'rb') as f:
+                unchanged = f.read() == data
+        except OSError:
+            unchanged = False
+        if unchanged:
+            print(colorize(f"[UNCHANGED] Config already up to date: {self.config_path}", Colors.CYAN))
+            return
 
         if self.dry_run:
+            self.backup_config()
             print(colorize("\n[DRY-RUN] Changes preview:", Colors.YELLOW))
-            existing = self.load_config()
-            self._show_diff(existing, config)
-        else:
-            with open(self.config_path, 'w') as f:
-                json.dump(config, f, indent=2)
-            print(colorize(f"[SAVED] Config written to: {self.config_path}", Colors.GREEN))
+            if existing is None:
+                existing = self.load_config()
+            self._show_diff(jsonio.dumps(existing), text)
+            return
+
+        # Old backups are pruned only here, never on restore, so a rollback
+        # can't delete the backup it was restored from
+        if self.backup_config():
+            self._prune_backups()
+        self._ensure_dir(self.openclaw_dir)
+        jsonio.write_atomic(self.config_path, data, fsync=True)
+        print(colorize(f"[SAVED] Config written to: {self.config_path}", Colors.GREEN))
 
     def generate_optimized_config(self) -> Dict:
         """Generate fully optimized OpenClaw configuration."""
-        return {
-            "agents": {
-                "defaults": {
-                    "model": {
-                        "primary": "anthropic/claude-haiku-4-5"
-                    },
-                    "cache": {
-                        "enabled": True,
-                        "ttl": "5m",
-                        "priority": "high"
-                    },
-                    "models": {
-                        "anthropic/claude-sonnet-4-5": {
-                            "alias": "sonnet",
-                            "cache": True
-                        },
-                        "anthropic/claude-haiku-4-5": {
-                            "alias": "haiku",
-                            "cache": False
-                        },
-                        "anthropic/claude-opus-4-5": {
-                            "alias": "opus",
-                            "cache": True
-                        }
-                    }
-                }
-            },
-            "heartbeat": {
-                "every": "1h",
-                "model": "ollama/llama3.2:3b",
-                "session": "main",
-                "prompt": "Check: Any blockers, opportunities, or progress updates needed?"
-            },
-            "rate_limits": {
-                "api_calls": {
-                    "min_interval_seconds": 5,
-                    "web_search_interval_seconds": 10,
-                    "max_searches_per_batch": 5,
-                    "batch_cooldown_seconds": 120
-                }
-            },
-            "budgets": {
-                "daily": 5.00,
-                "monthly": 200.00,
-                "warning_threshold": 0.75
-            },
-            "_meta": {
-                "optimized_by": "token-optimizer",
-                "version": __version__,
-                "optimized_at": datetime.now().isoformat()
-            }
+        config = copy.deepcopy(_OPTIMIZED_TEMPLATE)
+        config["_meta"] = {
+            "optimized_by": "token-optimizer",
+            "version": __version__,
+            "optimized_at": datetime.now().isoformat()
         }
+        return config
 
     def merge_config(self, existing: Dict, optimized: Dict) -> Dict:
         """Merge optimized settings into existing config, preserving user customizations."""
-        def deep_merge(base: Dict, override: Dict) -> Dict:
-            result = base.copy()
-            for key, value in override.items():
-                if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                    result[key] = deep_merge(result[key], value)
+        # Iterative deep merge: nested dicts present on both sides are copied
+        # once and merged in place; everything else is taken from `optimized`.
+        result = dict(existing)
+        stack = [(result, optimized)]
+        while stack:
+            dst, src = stack.pop()
+            for key, value in src.items():
+                current = dst.get(key)
+                if isinstance(current, dict) and isinstance(value, dict):
+                    current = dst[key] = dict(current)
+                    stack.append((current, value))
                 else:
-                    result[key] = value
-            return result
-
-        return deep_merge(existing, optimized)
+                    dst[key] = value
+        return result
 
     def apply_model_routing(self, config: Dict) -> Dict:
         """Apply model routing optimization only."""
-        optimized = self.generate_optimized_config()
-
-        if 'agents' not in config:
-            config['agents'] = {}
-        if 'defaults' not in config['agents']:
-            config['agents']['defaults'] = {}
-
-        config['agents']['defaults']['model'] = optimized['agents']['defaults']['model']
-        config['agents']['defaults']['models'] = optimized['agents']['defaults']['models']
+        defaults = config.setdefault('agents', {}).setdefault('defaults', {})
+        defaults['model'] = dict(_MODEL_PRIMARY)
+        defaults['models'] = copy.deepcopy(_MODEL_ALIASES)
 
         print(colorize("[APPLIED] Model routing: Haiku default, Sonnet/Opus aliases", Colors.GREEN))
         return config
 
     def apply_heartbeat(self, config: Dict, provider: str = None, model: str = None, fallback: str = None) -> Dict:
         """Apply heartbeat optimization with configurable provider."""
-        optimized = self.generate_optimized_config()
-
         if provider is None:
             provider = resolve_heartbeat_provider(config)
 
@@ -255,7 +531,7 @@ class TokenOptimizer:
             print(colorize("[APPLIED] Heartbeat: disabled", Colors.YELLOW))
             return config
 
-        heartbeat = optimized['heartbeat']
+        heartbeat = dict(_HEARTBEAT_SETTINGS)
         heartbeat['provider'] = provider
 
         if model:
@@ -275,37 +551,23 @@ class TokenOptimizer:
 
     def apply_caching(self, config: Dict) -> Dict:
         """Apply prompt caching optimization only."""
-        optimized = self.generate_optimized_config()
-
-        if 'agents' not in config:
-            config['agents'] = {}
-        if 'defaults' not in config['agents']:
-            config['agents']['defaults'] = {}
-
-        config['agents']['defaults']['cache'] = optimized['agents']['defaults']['cache']
+        defaults = config.setdefault('agents', {}).setdefault('defaults', {})
+        defaults['cache'] = dict(_CACHE_SETTINGS)
 
         print(colorize("[APPLIED] Prompt caching: Enabled with 5m TTL", Colors.GREEN))
         return config
 
     def apply_rate_limits(self, config: Dict) -> Dict:
         """Apply rate limits and budgets."""
-        optimized = self.generate_optimized_config()
-        config['rate_limits'] = optimized['rate_limits']
-        config['budgets'] = optimized['budgets']
+        config['rate_limits'] = copy.deepcopy(_RATE_LIMITS)
+        config['budgets'] = dict(_BUDGETS)
 
         print(colorize("[APPLIED] Rate limits and budget controls", Colors.GREEN))
         return config
 
     def check_ollama(self) -> bool:
         """Check if Ollama is installed and running."""
-        if shutil.which('ollama') is None:
-            return False
-        try:
-            req = urllib.request.Request("http://localhost:11434", method="GET")
-            urllib.request.urlopen(req, timeout=5)
-            return True
-        except Exception:
-            return False
+        return check_heartbeat_provider("ollama")
 
     def setup_heartbeat_provider(self, provider: str = "ollama", model: str = None, fallback: str = None) -> bool:
         """Set up heartbeat provider."""
@@ -359,12 +621,29 @@ class TokenOptimizer:
         """Attempt to set up Ollama for heartbeat (legacy compatibility)."""
         return self.setup_heartbeat_provider("ollama")
 
+    def _backup_names(self) -> List[str]:
+        """Backup file names, newest first."""
+        try:
+            with os.scandir(self.backup_dir) as entries:
+                names = [e.name for e in entries
+                         if e.name.startswith('openclaw_') and e.name.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        # Timestamped names sort chronologically, so no stat is needed
+        names.sort(reverse=True)
+        return names
+
+    def _prune_backups(self):
+        """Delete all but the newest MAX_BACKUPS config backups."""
+        for name in self._backup_names()[MAX_BACKUPS:]:
+            try:
+                os.unlink(os.path.join(self.backup_dir, name))
+            except OSError:
+                pass
+
     def list_backups(self) -> List[Path]:
         """List available config backups."""
-        if not self.backup_dir.exists():
-            return []
-        backups = sorted(self.backup_dir.glob('openclaw_*.json'), reverse=True)
-        return backups
+        return [self.backup_dir / name for name in self._backup_names()]
 
     def restore_backup(self, backup_path: Path) -> bool:
         """Restore a config backup."""
@@ -372,10 +651,10 @@ class TokenOptimizer:
             print(colorize(f"[ERROR] Backup not found: {backup_path}", Colors.RED))
             return False
 
+        data = backup_path.read_bytes()
         try:
-            with open(backup_path, 'r') as f:
-                json.load(f)  # validate JSON
-        except json.JSONDecodeError:
+            jsonio.loads(data)  # validate JSON
+        except jsonio.JSONDecodeError:
             print(colorize(f"[ERROR] Backup is not valid JSON: {backup_path}", Colors.RED))
             return False
 
@@ -386,14 +665,17 @@ class TokenOptimizer:
         # Backup current config before restoring
         self.backup_config()
 
-        shutil.copy(backup_path, self.config_path)
+        jsonio.write_atomic(self.config_path, data, fsync=True)
         print(colorize(f"[RESTORED] Config restored from: {backup_path}", Colors.GREEN))
         return True
 
-    def _show_diff(self, old_config: Dict, new_config: Dict):
-        """Show colored unified diff between old and new config."""
-        old_lines = json.dumps(old_config, indent=2).splitlines(keepends=True)
-        new_lines = json.dumps(new_config, indent=2).splitlines(keepends=True)
+    def _show_diff(self, old_text: str, new_text: str):
+        """Show colored unified diff between old and new serialized config."""
+        # Only dry runs preview a diff, so don't load difflib otherwise
+        import difflib
+
+        old_lines = old_text.splitlines(keepends=True)
+        new_lines = new_text.splitlines(keepends=True)
 
         diff = list(difflib.unified_diff(
             old_lines, new_lines,
@@ -406,18 +688,20 @@ class TokenOptimizer:
             print(colorize("  (no changes)", Colors.YELLOW))
             return
 
+        out = []
         for line in diff:
             line = line.rstrip('\n')
-            if line.startswith('+++') or line.startswith('---'):
-                print(colorize(line, Colors.BOLD))
+            if line.startswith(('+++', '---')):
+                out.append(colorize(line, Colors.BOLD))
             elif line.startswith('+'):
-                print(colorize(line, Colors.GREEN))
+                out.append(colorize(line, Colors.GREEN))
             elif line.startswith('-'):
-                print(colorize(line, Colors.RED))
+                out.append(colorize(line, Colors.RED))
             elif line.startswith('@@'):
-                print(colorize(line, Colors.CYAN))
+                out.append(colorize(line, Colors.CYAN))
             else:
-                print(line)
+                out.append(line)
+        sys.stdout.write('\n'.join(out) + '\n')
 
     def init_stats(self):
         """Initialize or update stats tracking file for benefit reports."""
@@ -425,48 +709,54 @@ class TokenOptimizer:
 
         if stats_path.exists():
             try:
-                with open(stats_path, 'r') as f:
-                    stats = json.load(f)
-            except json.JSONDecodeError:
+                stats = jsonio.loads(stats_path.read_bytes())
+            except jsonio.JSONDecodeError:
                 stats = {}
         else:
             stats = {}
 
-        if 'installed_at' not in stats:
-            stats['installed_at'] = datetime.now().isoformat()
-
-        stats['last_optimized'] = datetime.now().isoformat()
+        now = datetime.now().isoformat()
+        stats.setdefault('installed_at', now)
+        stats['last_optimized'] = now
         stats.setdefault('last_benefit_report', None)
         stats.setdefault('verify_count', 0)
 
         if not self.dry_run:
-            with open(stats_path, 'w') as f:
-                json.dump(stats, f, indent=2)
+            self._ensure_dir(self.openclaw_dir)
+            jsonio.dump_atomic(stats, stats_path)
             print(colorize("[STATS] Tracking initialized for savings reports", Colors.BLUE))
 
     def optimize_full(self):
         """Apply all optimizations."""
         print(colorize("\n=== Token Optimizer - Full Optimization ===\n", Colors.BOLD + Colors.CYAN))
 
-        # Backup existing config
-        self.backup_config()
-
-        # Load existing config
+        # Load existing config (save_config backs it up before writing)
         existing = self.load_config()
 
         # Generate and merge optimized config
         optimized = self.generate_optimized_config()
         final_config = self.merge_config(existing, optimized)
 
+        # Re-running on an already optimized config keeps its timestamp, so
+        # save_config sees no change and skips the write and backup
+        previous = existing.get('_meta')
+        if isinstance(previous, dict) and 'optimized_at' in previous:
+            stamp = final_config['_meta']['optimized_at']
+            final_config['_meta']['optimized_at'] = previous['optimized_at']
+            if final_config != existing:
+                final_config['_meta']['optimized_at'] = stamp
+
         # Apply all optimizations
-        print(colorize("\nApplying optimizations:", Colors.BOLD))
-        print(colorize("  [1/4] Model routing (Haiku default)", Colors.GREEN))
-        print(colorize("  [2/4] Heartbeat to Ollama (free)", Colors.GREEN))
-        print(colorize("  [3/4] Prompt caching (90% savings)", Colors.GREEN))
-        print(colorize("  [4/4] Rate limits & budgets", Colors.GREEN))
+        sys.stdout.write("\n".join((
+            colorize("\nApplying optimizations:", Colors.BOLD),
+            colorize("  [1/4] Model routing (Haiku default)", Colors.GREEN),
+            colorize("  [2/4] Heartbeat to Ollama (free)", Colors.GREEN),
+            colorize("  [3/4] Prompt caching (90% savings)", Colors.GREEN),
+            colorize("  [4/4] Rate limits & budgets", Colors.GREEN),
+        )) + "\n")
 
         # Save config
-        self.save_config(final_config)
+        self.save_config(final_config, existing)
 
         # Setup Ollama
         self.setup_ollama_heartbeat()
@@ -480,245 +770,86 @@ class TokenOptimizer:
         # Initialize stats tracking
         self.init_stats()
 
-        print(colorize("\n=== Optimization Complete ===", Colors.BOLD + Colors.GREEN))
-        print("\nNext steps:")
-        print("  1. Review generated files in ~/.openclaw/")
-        print("  2. Add agent prompt rules from ~/.openclaw/prompts/")
-        print("  3. Start Ollama: ollama serve")
-        print("  4. Verify with: token-optimizer verify")
+        sys.stdout.write("\n".join((
+            colorize("\n=== Optimization Complete ===", Colors.BOLD + Colors.GREEN),
+            "\nNext steps:",
+            "  1. Review generated files in ~/.openclaw/",
+            "  2. Add agent prompt rules from ~/.openclaw/prompts/",
+            "  3. Start Ollama: ollama serve",
+            "  4. Verify with: token-optimizer verify",
+        )) + "\n")
 
     def optimize_mode(self, mode: str):
         """Apply specific optimization mode."""
-        self.backup_config()
-        config = self.load_config()
-
-        if mode == 'routing':
-            config = self.apply_model_routing(config)
-        elif mode == 'heartbeat':
-            config = self.apply_heartbeat(config)
-            self.setup_ollama_heartbeat()
-        elif mode == 'caching':
-            config = self.apply_caching(config)
-        elif mode == 'limits':
-            config = self.apply_rate_limits(config)
-        elif mode == 'full':
+        if mode == 'full':
+            # optimize_full loads and saves the config itself
             self.optimize_full()
             return
-        else:
+
+        apply = {
+            'routing': self.apply_model_routing,
+            'heartbeat': self.apply_heartbeat,
+            'caching': self.apply_caching,
+            'limits': self.apply_rate_limits,
+        }.get(mode)
+        if apply is None:
             print(colorize(f"[ERROR] Unknown mode: {mode}", Colors.RED))
             return
 
+        config = apply(self.load_config())
+        if mode == 'heartbeat':
+            self.setup_ollama_heartbeat()
         self.save_config(config)
 
+    def _generate_files(self, directory: Path, files: Tuple[Tuple[str, str], ...]):
+        """Write (filename, content) pairs into directory, never overwriting."""
+        existing = set()
+        if not self.dry_run:
+            # One directory scan instead of an exists() stat per file
+            try:
+                with os.scandir(directory) as entries:
+                    existing = {e.name for e in entries}
+            except FileNotFoundError:
+                pass
+
+        for filename, content in files:
+            filepath = directory / filename
+            if filename in existing:
+                print(colorize(f"  [SKIP] {filename} already exists", Colors.YELLOW))
+                continue
+            if not self.dry_run:
+                self._ensure_dir(directory)
+                try:
+                    # O_EXCL lets case-insensitive filesystems reject a name
+                    # that exists under another casing
+                    _write_text(filepath, content)
+                except FileExistsError:
+                    print(colorize(f"  [SKIP] {filename} already exists", Colors.YELLOW))
+                    continue
+            print(colorize(f"  [CREATED] {filepath}", Colors.GREEN))
+
     def generate_workspace_templates(self):
         """Generate optimized workspace file templates."""
         workspace_dir = self.openclaw_dir / 'workspace'
-        workspace_dir.mkdir(parents=True, exist_ok=True)
-
-        # SOUL.md template
-        soul_content = """# SOUL.md - Agent Core Principles
-
-## Identity
-[YOUR AGENT NAME/ROLE]
-
-## Core Principles
-1. Efficiency first - minimize token usage
-2. Quality over quantity - precise responses
-3. Proactive communication - surface blockers early
-
-## How to Operate
-- Default to Haiku for routine tasks
-- Switch to Sonnet only for: architecture, security, complex reasoning
-- Batch similar operations together
-- Use memory_search() on demand, not auto-load
-
-## Model Selection Rule
-```
-Default: Always use Haiku
-Switch to Sonnet ONLY when:
-- Architecture decisions
-- Production code review
-- Security analysis
-- Complex debugging/reasoning
-- Strategic multi-project decisions
-
-When in doubt: Try Haiku first.
-```
-
-## Rate Limits
-- 5s between API calls
-- 10s between searches
-- Max 5 searches/batch, then 2min break
-"""
-
-        # USER.md template
-        user_content = """# USER.md - User Context
-
-## Profile
-- **Name:** [YOUR NAME]
-- **Timezone:** [YOUR TIMEZONE]
-- **Working Hours:** [YOUR HOURS]
-
-## Mission
-[WHAT YOU'RE BUILDING]
-
-## Success Metrics
-1. [METRIC 1]
-2. [METRIC 2]
-3. [METRIC 3]
-
-## Communication Preferences
-- Brief, actionable updates
-- Surface blockers immediately
-- Daily summary at end of session
-"""
-
-        # IDENTITY.md template
-        identity_content = """# IDENTITY.md - Agent Identity
-
-## Role
-[AGENT ROLE - e.g., "Technical Lead", "Research Assistant"]
-
-## Expertise
-- [DOMAIN 1]
-- [DOMAIN 2]
-- [DOMAIN 3]
-
-## Constraints
-- Stay within defined budgets
-- Follow rate limits strictly
-- Escalate uncertainty early
-"""
-
-        templates = {
-            'SOUL.md': soul_content,
-            'USER.md': user_content,
-            'IDENTITY.md': identity_content
-        }
 
         print(colorize("\n--- Generating Workspace Templates ---", Colors.BOLD))
-
-        for filename, content in templates.items():
-            filepath = workspace_dir / filename
-            if filepath.exists() and not self.dry_run:
-                print(colorize(f"  [SKIP] {filename} already exists", Colors.YELLOW))
-            else:
-                if not self.dry_run:
-                    with open(filepath, 'w') as f:
-                        f.write(content.strip())
-                print(colorize(f"  [CREATED] {filepath}", Colors.GREEN))
+        self._generate_files(workspace_dir, _WORKSPACE_TEMPLATES)
 
     def generate_agent_prompts(self):
         """Generate agent prompt additions for optimization."""
         prompts_dir = self.openclaw_dir / 'prompts'
-        prompts_dir.mkdir(parents=True, exist_ok=True)
-
-        # Session initialization rule
-        session_init = """## SESSION INITIALIZATION RULE
-
-On every session start:
-1. Load ONLY these files:
-   - SOUL.md
-   - USER.md
-   - IDENTITY.md
-   - memory/YYYY-MM-DD.md (if it exists)
-
-2. DO NOT auto-load:
-   - MEMORY.md
-   - Session history
-   - Prior messages
-   - Previous tool outputs
-
-3. When user asks about prior context:
-   - Use memory_search() on demand
-   - Pull only the relevant snippet with memory_get()
-   - Don't load the whole file
-
-4. Update memory/YYYY-MM-DD.md at end of session with:
-   - What you worked on
-   - Decisions made
-   - Leads generated
-   - Blockers
-   - Next steps
-
-This saves 80% on context overhead.
-"""
-
-        # Model selection rule
-        model_selection = """## MODEL SELECTION RULE
-
-Default: Always use Haiku
-
-Switch to Sonnet ONLY when:
-- Architecture decisions
-- Production code review
-- Security analysis
-- Complex debugging/reasoning
-- Strategic multi-project decisions
-
-When in doubt: Try Haiku first.
-"""
-
-        # Rate limits rule
-        rate_limits = """## RATE LIMITS
-
-- 5 seconds minimum between API calls
-- 10 seconds between web searches
-- Max 5 searches per batch, then 2-minute break
-- Batch similar work (one request for 10 leads, not 10 requests)
-- If you hit 429 error: STOP, wait 5 minutes, retry
-
-## DAILY BUDGET: $5 (warning at 75%)
-## MONTHLY BUDGET: $200 (warning at 75%)
-"""
-
-        # Combined optimization prompt
-        combined = f"""# TOKEN OPTIMIZATION RULES
-
-Add these rules to your agent prompt:
-
----
-
-{session_init}
-
----
-
-{model_selection}
-
----
-
-{rate_limits}
-
----
-
-## IMPORTANT
-These rules work together to reduce costs by 97%.
-Do not remove or modify unless you understand the cost implications.
-"""
-
-        prompts = {
-            'session-init.md': session_init,
-            'model-selection.md': model_selection,
-            'rate-limits.md': rate_limits,
-            'OPTIMIZATION-RULES.md': combined
-        }
 
         print(colorize("\n--- Generating Agent Prompts ---", Colors.BOLD))
-
-        for filename, content in prompts.items():
-            filepath = prompts_dir / filename
-            if filepath.exists() and not self.dry_run:
-                print(colorize(f"  [SKIP] {filename} already exists", Colors.YELLOW))
-            else:
-                if not self.dry_run:
-                    with open(filepath, 'w') as f:
-                        f.write(content.strip())
-                print(colorize(f"  [CREATED] {filepath}", Colors.GREEN))
+        self._generate_files(prompts_dir, _AGENT_PROMPTS)
 
         print(colorize(f"\n[INFO] Add contents of {prompts_dir / 'OPTIMIZATION-RULES.md'} to your agent prompt", Colors.CYAN))
 
 
 def main():
+    # Only the standalone script parses arguments; the CLI imports this
+    # module for its classes and must not pay for argparse
+    import argparse
+
     parser = argparse.ArgumentParser(description='Token Optimizer for OpenClaw')
     parser.add_argument('--mode', choices=['full', 'routing', 'heartbeat', 'caching', 'limits'],
                        default='full', help='Optimization mode')
@@ -4,43 +4,60 @@ Token Optimizer - Verification Module
 Verifies optimization setup and estimates savings.
 """
 
-import json
 import os
 import sys
 import shutil
-import urllib.request
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple
 
 try:
     from src.colors import Colors, colorize
+    from src import jsonio, net
 except ImportError:
     from colors import Colors, colorize
+    import jsonio
+    import net
+
+
+# Horizontal rule around the verification results table
+_RULE = "-" * 60
 
 
 class OptimizationVerifier:
     """Verifies token optimization setup."""
 
+    __slots__ = ('openclaw_dir', 'config_path', '_config_path_str', 'checks')
+
+    # What the config-driven checks report for an empty (missing or invalid) config
+    _EMPTY_CONFIG_CHECKS = (
+        ("Default model is Haiku", False, "not set"),
+        ("Model aliases configured", False, "none"),
+        ("Heartbeat provider configured", False, "not configured"),
+        ("Prompt caching enabled", False, "TTL: not set"),
+        ("Rate limits configured", False, "not configured"),
+        ("Budget limits configured", False, "not configured"),
+    )
+
     def __init__(self):
         self.openclaw_dir = Path.home() / '.openclaw'
         self.config_path = self.openclaw_dir / 'openclaw.json'
+        # str form for the file operations; Path is kept for display
+        self._config_path_str = os.fspath(self.config_path)
         self.checks: List[Tuple[str, bool, str]] = []
 
     def load_config(self) -> Dict:
         """Load OpenClaw configuration."""
-        if self.config_path.exists():
-            try:
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        try:
+            with open(self._config_path_str, 'rb') as f:
+                return jsonio.loads(f.read())
+        except (FileNotFoundError, jsonio.JSONDecodeError):
+            return {}
 
     def check_config_exists(self) -> bool:
         """Check if config file exists."""
-        exists = self.config_path.exists()
-        self.checks.append(("Config file exists", exists, str(self.config_path)))
+        exists = os.path.exists(self._config_path_str)
+        self.checks.append(("Config file exists", exists, self._config_path_str))
         return exists
 
     def check_model_routing(self, config: Dict) -> bool:
@@ -79,12 +96,11 @@ class OptimizationVerifier:
 
             # Auto-detect provider from model string if not explicit
             if not provider:
-                for name in ('ollama', 'lmstudio', 'groq'):
-                    if name in model.lower():
-                        provider = name
-                        break
-                if not provider:
-                    provider = 'ollama'
+                model_lc = model.lower()
+                provider = next(
+                    (name for name in ('ollama', 'lmstudio', 'groq') if name in model_lc),
+                    'ollama'
+                )
 
             is_free = provider in ('ollama', 'lmstudio', 'none')
             label = f"{provider} ({model})" if model else provider
@@ -104,20 +120,10 @@ class OptimizationVerifier:
         if provider == "ollama":
             if shutil.which("ollama") is None:
                 return False
-            try:
-                req = urllib.request.Request("http://localhost:11434", method="GET")
-                urllib.request.urlopen(req, timeout=5)
-                return True
-            except Exception:
-                return False
+            return net.endpoint_reachable("http://localhost:11434")
         elif provider in ("lmstudio", "groq"):
             url = endpoint or ("http://localhost:1234" if provider == "lmstudio" else "https://api.groq.com")
-            try:
-                req = urllib.request.Request(url, method="GET")
-                urllib.request.urlopen(req, timeout=5)
-                return True
-            except Exception:
-                return False
+            return net.endpoint_reachable(url)
         return False
 
     def check_caching_enabled(self, config: Dict) -> bool:
@@ -163,14 +169,21 @@ class OptimizationVerifier:
         workspace_dir = self.openclaw_dir / 'workspace'
         required_files = ['SOUL.md', 'USER.md']
 
+        # One directory scan instead of exists() + stat() per file
+        try:
+            with os.scandir(workspace_dir) as it:
+                entries = {e.name: e for e in it}
+        except FileNotFoundError:
+            entries = {}
+
         found = []
         total_size = 0
 
         for filename in required_files:
-            filepath = workspace_dir / filename
-            if filepath.exists():
+            entry = entries.get(filename)
+            if entry is not None:
                 found.append(filename)
-                total_size += filepath.stat().st_size
+                total_size += entry.stat().st_size
 
         all_found = len(found) == len(required_files)
         size_kb = total_size / 1024
@@ -200,8 +213,10 @@ class OptimizationVerifier:
             'total': 0
         }
 
+        defaults = config.get('agents', {}).get('defaults', {})
+
         # Model routing savings (Sonnet -> Haiku)
-        primary = config.get('agents', {}).get('defaults', {}).get('model', {}).get('primary', '')
+        primary = defaults.get('model', {}).get('primary', '')
         if 'haiku' in primary.lower():
             # Assume 100 calls/day, 2000 tokens each
             # Sonnet: 0.003 * 200 = $0.60/day
@@ -215,15 +230,15 @@ class OptimizationVerifier:
             savings['heartbeat'] = 24 * 0.5 * 0.00025 * 30  # ~$0.09/month (small but free)
 
         # Caching savings (90% on repeated content)
-        cache = config.get('agents', {}).get('defaults', {}).get('cache', {})
-        if cache.get('enabled'):
+        if defaults.get('cache', {}).get('enabled'):
             # 5KB agent prompt * 100 calls/day * 0.003/1K * 0.9 savings
             savings['caching'] = 5 * 100 * 0.003 * 0.9 * 30  # ~$40.50/month
 
         # Session management (estimated from lean context)
         savings['session'] = 12.00  # Estimated from guide
 
-        savings['total'] = sum(v for k, v in savings.items() if k != 'total')
+        savings['total'] = (savings['model_routing'] + savings['heartbeat'] +
+                            savings['caching'] + savings['session'])
 
         return savings
 
@@ -231,13 +246,10 @@ class OptimizationVerifier:
         """Show benefit report every 7 days with donation CTA."""
         stats_path = self.openclaw_dir / 'token-optimizer-stats.json'
 
-        if not stats_path.exists():
-            return
-
+        # A missing stats file is just an IOError here, no exists() probe needed
         try:
-            with open(stats_path, 'r') as f:
-                stats = json.load(f)
-        except (json.JSONDecodeError, IOError):
+            stats = jsonio.loads(stats_path.read_bytes())
+        except (jsonio.JSONDecodeError, IOError):
             return
 
         installed_at = stats.get('installed_at')
@@ -272,28 +284,29 @@ class OptimizationVerifier:
         yearly_projection = savings['total'] * 12
 
         # Show benefit report
-        print(colorize("\n  +--------------------------------------------------+", Colors.BOLD + Colors.GREEN))
-        print(colorize("  |         Your Savings Report                      |", Colors.BOLD + Colors.GREEN))
-        print(colorize("  +--------------------------------------------------+", Colors.GREEN))
-        print(colorize(f"  |  Active for: {days_active} days                              ", Colors.GREEN))
-        print(colorize(f"  |                                                  ", Colors.GREEN))
-        print(colorize(f"  |  Savings this week:       ~${weekly_savings:>8.2f}          ", Colors.GREEN))
-        print(colorize(f"  |  Savings since install:   ~${total_savings:>8.2f}          ", Colors.GREEN))
-        print(colorize(f"  |  Projected yearly:        ~${yearly_projection:>8.2f}          ", Colors.GREEN))
-        print(colorize(f"  |                                                  ", Colors.GREEN))
-        print(colorize(f"  |  Token Optimizer is saving you real money.       ", Colors.GREEN))
-        print(colorize(f"  |  If it helps, consider a small thank-you:       ", Colors.GREEN))
-        print(colorize(f"  |                                                  ", Colors.GREEN))
-        print(colorize(f"  |  -> https://ko-fi.com/smartpeopleconnected       ", Colors.CYAN + Colors.BOLD))
-        print(colorize(f"  |                                                  ", Colors.GREEN))
-        print(colorize("  +--------------------------------------------------+", Colors.GREEN))
+        sys.stdout.write("\n".join((
+            colorize("\n  +--------------------------------------------------+", Colors.BOLD + Colors.GREEN),
+            colorize("  |         Your Savings Report                      |", Colors.BOLD + Colors.GREEN),
+            colorize("  +--------------------------------------------------+", Colors.GREEN),
+            colorize(f"  |  Active for: {days_active} days                              ", Colors.GREEN),
+            colorize("  |                                                  ", Colors.GREEN),
+            colorize(f"  |  Savings this week:       ~${weekly_savings:>8.2f}          ", Colors.GREEN),
+            colorize(f"  |  Savings since install:   ~${total_savings:>8.2f}          ", Colors.GREEN),
+            colorize(f"  |  Projected yearly:        ~${yearly_projection:>8.2f}          ", Colors.GREEN),
+            colorize("  |                                                  ", Colors.GREEN),
+            colorize("  |  Token Optimizer is saving you real money.       ", Colors.GREEN),
+            colorize("  |  If it helps, consider a small thank-you:       ", Colors.GREEN),
+            colorize("  |                                                  ", Colors.GREEN),
+            colorize("  |  -> https://ko-fi.com/smartpeopleconnected       ", Colors.CYAN + Colors.BOLD),
+            colorize("  |                                                  ", Colors.GREEN),
+            colorize("  +--------------------------------------------------+", Colors.GREEN),
+        )) + "\n")
 
         # Update last report timestamp
         stats['last_benefit_report'] = now.isoformat()
         stats['verify_count'] = stats.get('verify_count', 0) + 1
         try:
-            with open(stats_path, 'w') as f:
-                json.dump(stats, f, indent=2)
+            jsonio.dump_atomic(stats, stats_path)
         except IOError:
             pass
 
@@ -306,34 +319,36 @@ class OptimizationVerifier:
 
         # Run checks
         self.check_config_exists()
-        self.check_model_routing(config)
-        self.check_model_aliases(config)
-        self.check_heartbeat_provider(config)
-        self.check_caching_enabled(config)
-        self.check_rate_limits(config)
-        self.check_budgets(config)
+        if config:
+            self.check_model_routing(config)
+            self.check_model_aliases(config)
+            self.check_heartbeat_provider(config)
+            self.check_caching_enabled(config)
+            self.check_rate_limits(config)
+            self.check_budgets(config)
+        else:
+            self.checks.extend(self._EMPTY_CONFIG_CHECKS)
         self.check_workspace_files()
         self.check_prompts_exist()
 
-        # Print results
-        print(colorize("VERIFICATION RESULTS:", Colors.BOLD))
-        print("-" * 60)
+        # Collect the report and write it once
+        out = []
+        out.append(colorize("VERIFICATION RESULTS:", Colors.BOLD))
+        out.append(_RULE)
 
+        pass_icon = colorize("[PASS]", Colors.GREEN)
+        fail_icon = colorize("[FAIL]", Colors.RED)
         passed = 0
-        failed = 0
 
         for name, status, details in self.checks:
             if status:
-                icon = colorize("[PASS]", Colors.GREEN)
                 passed += 1
-            else:
-                icon = colorize("[FAIL]", Colors.RED)
-                failed += 1
+            out.append(f"  {pass_icon if status else fail_icon} {name}")
+            out.append(colorize(f"         {details}", Colors.BLUE))
 
-            print(f"  {icon} {name}")
-            print(colorize(f"         {details}", Colors.BLUE))
+        failed = len(self.checks) - passed
 
-        print("-" * 60)
+        out.append(_RULE)
 
         # Summary
         total = passed + failed
@@ -349,27 +364,29 @@ class OptimizationVerifier:
             status_color = Colors.RED
             status_text = "NEEDS OPTIMIZATION"
 
-        print(colorize(f"\nStatus: {status_text}", Colors.BOLD + status_color))
-        print(f"Score: {passed}/{total} checks passed ({score:.0f}%)")
+        out.append(colorize(f"\nStatus: {status_text}", Colors.BOLD + status_color))
+        out.append(f"Score: {passed}/{total} checks passed ({score:.0f}%)")
 
         # Calculate and show savings
         savings = self.calculate_savings(config)
 
-        print(colorize("\n--- ESTIMATED MONTHLY SAVINGS ---", Colors.BOLD))
-        print(f"  Model Routing:    ${savings['model_routing']:.2f}")
-        print(f"  Heartbeat:        ${savings['heartbeat']:.2f}")
-        print(f"  Prompt Caching:   ${savings['caching']:.2f}")
-        print(f"  Session Mgmt:     ${savings['session']:.2f}")
-        print(colorize(f"  TOTAL:            ${savings['total']:.2f}/month", Colors.BOLD + Colors.GREEN))
-        print(colorize(f"  YEARLY:           ${savings['total'] * 12:.2f}/year", Colors.GREEN))
+        out.append(colorize("\n--- ESTIMATED MONTHLY SAVINGS ---", Colors.BOLD))
+        out.append(f"  Model Routing:    ${savings['model_routing']:.2f}")
+        out.append(f"  Heartbeat:        ${savings['heartbeat']:.2f}")
+        out.append(f"  Prompt Caching:   ${savings['caching']:.2f}")
+        out.append(f"  Session Mgmt:     ${savings['session']:.2f}")
+        out.append(colorize(f"  TOTAL:            ${savings['total']:.2f}/month", Colors.BOLD + Colors.GREEN))
+        out.append(colorize(f"  YEARLY:           ${savings['total'] * 12:.2f}/year", Colors.GREEN))
 
         # Recommendations
         if failed > 0:
-            print(colorize("\n--- RECOMMENDATIONS ---", Colors.BOLD + Colors.YELLOW))
+            out.append(colorize("\n--- RECOMMENDATIONS ---", Colors.BOLD + Colors.YELLOW))
             for name, status, details in self.checks:
                 if not status:
-                    print(f"  - Fix: {name}")
-            print(colorize("\nRun 'token-optimizer optimize' to apply missing optimizations", Colors.CYAN))
+                    out.append(f"  - Fix: {name}")
+            out.append(colorize("\nRun 'token-optimizer optimize' to apply missing optimizations", Colors.CYAN))
+
+        sys.stdout.write("\n".join(out) + "\n")
 
         # Show benefit report (every 7 days)
         self.check_benefit_report(savings)
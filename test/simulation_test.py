@@ -4,10 +4,9 @@ Token Optimizer - Simulation Test
 Demonstrates before/after performance comparison with mock data.
 """
 
-import json
 import os
 import sys
-import shutil
+import tempfile
 from pathlib import Path
 from datetime import datetime
 
@@ -18,8 +17,7 @@ if sys.platform == 'win32':
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from analyzer import OpenClawAnalyzer
-from optimizer import TokenOptimizer
+import jsonio
 
 # ANSI colors
 class Colors:
@@ -31,11 +29,17 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
+# The script owns stdout for its whole run, so check for a terminal once
+_TTY = sys.stdout.isatty()
+
 def colorize(text, color):
-    if sys.stdout.isatty():
+    if _TTY:
         return f"{color}{text}{Colors.END}"
     return text
 
+# Banner rule shared by the phase headers and cost reports
+_RULE = "=" * 60
+
 # Cost constants
 COSTS = {
     'opus': {'input': 0.015, 'output': 0.075},
@@ -44,6 +48,26 @@ COSTS = {
     'ollama': {'input': 0.0, 'output': 0.0}
 }
 
+# Prompt caching: cache reads are billed at 10% of the input price, and
+# prompts shorter than the minimum cacheable length are never cached
+CACHE_READ_DISCOUNT = 0.9
+CACHE_HIT_RATE = 0.8
+MIN_CACHEABLE_TOKENS = 1024
+
+# Batch API discount for background work that tolerates delayed results,
+# such as heartbeats. Projected only; the simulation never batches.
+BATCH_DISCOUNT = 0.5
+
+# Model keywords checked in order against lowercased model names;
+# anything unmatched is priced as Sonnet
+PRIMARY_MODELS = ('haiku', 'opus')
+HEARTBEAT_MODELS = ('ollama', 'haiku')
+
+def detect_model(model_name: str, candidates: tuple) -> str:
+    """Return the first candidate found in model_name, defaulting to sonnet."""
+    name = model_name.lower()
+    return next((m for m in candidates if m in name), 'sonnet')
+
 def create_mock_environment(test_dir: Path):
     """Create a mock OpenClaw environment for testing."""
 
@@ -72,8 +96,7 @@ def create_mock_environment(test_dir: Path):
     }
 
     config_path = openclaw_dir / 'openclaw.json'
-    with open(config_path, 'w') as f:
-        json.dump(unoptimized_config, f, indent=2)
+    config_path.write_text(jsonio.dumps(unoptimized_config))
 
     # Create BLOATED workspace files (typical unoptimized setup)
 
@@ -84,7 +107,7 @@ def create_mock_environment(test_dir: Path):
 You are an AI assistant...
 
 ## Detailed History
-""" + "\n".join([f"- Historical entry {i}: Lorem ipsum dolor sit amet, consectetur adipiscing elit. Sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris." for i in range(100)])
+""" + "\n".join(map("- Historical entry {0}: Lorem ipsum dolor sit amet, consectetur adipiscing elit. Sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris.".format, range(100)))
 
     with open(workspace_dir / 'SOUL.md', 'w') as f:
         f.write(soul_content)
@@ -93,7 +116,7 @@ You are an AI assistant...
     memory_content = """# MEMORY.md - Full History
 
 ## All Previous Sessions
-""" + "\n".join([f"### Session {i}\nUser asked about topic {i}. Assistant responded with detailed explanation about subject {i}. This conversation covered multiple aspects including technical details, examples, and follow-up questions. The user was satisfied with the response.\n" for i in range(200)])
+""" + "\n".join(map("### Session {0}\nUser asked about topic {0}. Assistant responded with detailed explanation about subject {0}. This conversation covered multiple aspects including technical details, examples, and follow-up questions. The user was satisfied with the response.\n".format, range(200)))
 
     with open(workspace_dir / 'MEMORY.md', 'w') as f:
         f.write(memory_content)
@@ -102,7 +125,7 @@ You are an AI assistant...
     user_content = """# USER.md - User Profile
 
 ## Complete User History
-""" + "\n".join([f"- Preference {i}: User likes detailed explanations with examples and code snippets when relevant." for i in range(150)])
+""" + "\n".join(map("- Preference {0}: User likes detailed explanations with examples and code snippets when relevant.".format, range(150)))
 
     with open(workspace_dir / 'USER.md', 'w') as f:
         f.write(user_content)
@@ -111,32 +134,21 @@ You are an AI assistant...
     print(f"  Config: Sonnet default, paid heartbeats, no caching")
     print(f"  Workspace files: ~50KB total (bloated)")
 
-    return openclaw_dir
+    return openclaw_dir, unoptimized_config
 
 def calculate_costs(config: dict, workspace_size_kb: float, daily_messages: int = 100, daily_heartbeats: int = 24):
     """Calculate estimated daily/monthly costs."""
 
     # Determine model
     model_name = config.get('agents', {}).get('defaults', {}).get('model', {}).get('primary', '')
-    if 'haiku' in model_name.lower():
-        model = 'haiku'
-    elif 'opus' in model_name.lower():
-        model = 'opus'
-    else:
-        model = 'sonnet'
+    model = detect_model(model_name, PRIMARY_MODELS)
 
     # Heartbeat model
     hb_model_name = config.get('heartbeat', {}).get('model', '')
-    if 'ollama' in hb_model_name.lower():
-        hb_model = 'ollama'
-    elif 'haiku' in hb_model_name.lower():
-        hb_model = 'haiku'
-    else:
-        hb_model = 'sonnet'
+    hb_model = detect_model(hb_model_name, HEARTBEAT_MODELS)
 
     # Caching
     cache_enabled = config.get('agents', {}).get('defaults', {}).get('cache', {}).get('enabled', False)
-    cache_discount = 0.9 if cache_enabled else 0.0
 
     # Calculate costs
     costs = COSTS[model]
@@ -152,12 +164,12 @@ def calculate_costs(config: dict, workspace_size_kb: float, daily_messages: int
     input_cost = (context_tokens / 1000) * costs['input']
     output_cost = (avg_output_tokens / 1000) * costs['output']
 
-    # Apply cache discount to input (agent prompt)
-    if cache_enabled:
-        # First message full price, subsequent 90% off
-        cached_input_cost = input_cost * (1 - cache_discount * 0.8)  # 80% of messages cached
+    # Apply cache discount to the context read from cache (cache hits only)
+    if cache_enabled and context_tokens >= MIN_CACHEABLE_TOKENS:
+        cached_tokens = context_tokens * CACHE_HIT_RATE
     else:
-        cached_input_cost = input_cost
+        cached_tokens = 0
+    cached_input_cost = input_cost - (cached_tokens / 1000) * costs['input'] * CACHE_READ_DISCOUNT
 
     message_cost = cached_input_cost + output_cost
 
@@ -169,15 +181,18 @@ def calculate_costs(config: dict, workspace_size_kb: float, daily_messages: int
     daily_message_cost = message_cost * daily_messages
     daily_hb_cost = hb_cost * daily_heartbeats
     daily_total = daily_message_cost + daily_hb_cost
+    daily_hb_batch_cost = daily_hb_cost * BATCH_DISCOUNT
 
     return {
         'model': model,
         'heartbeat_model': hb_model,
         'cache_enabled': cache_enabled,
         'context_tokens': context_tokens,
+        'cached_tokens': cached_tokens,
         'per_message_cost': message_cost,
         'daily_message_cost': daily_message_cost,
         'daily_heartbeat_cost': daily_hb_cost,
+        'daily_heartbeat_batch_cost': daily_hb_batch_cost,
         'daily_total': daily_total,
         'monthly_total': daily_total * 30,
         'yearly_total': daily_total * 365
@@ -186,62 +201,51 @@ def calculate_costs(config: dict, workspace_size_kb: float, daily_messages: int
 def print_cost_report(title: str, costs: dict, color: str):
     """Print a formatted cost report."""
 
-    print(colorize(f"\n{'='*60}", color))
-    print(colorize(f"  {title}", Colors.BOLD + color))
-    print(colorize(f"{'='*60}", color))
+    if costs['cache_enabled']:
+        caching = f"Enabled ({costs['cached_tokens']:,.0f} tokens cached per message)"
+    else:
+        caching = "Disabled"
 
-    print(f"\n  Configuration:")
-    print(f"    Model:          {costs['model'].upper()}")
-    print(f"    Heartbeat:      {costs['heartbeat_model'].upper()}")
-    print(f"    Caching:        {'Enabled' if costs['cache_enabled'] else 'Disabled'}")
-    print(f"    Context:        {costs['context_tokens']:,.0f} tokens ({costs['context_tokens']/250:.1f}KB)")
+    out = [
+        colorize(f"\n{_RULE}", color),
+        colorize(f"  {title}", Colors.BOLD + color),
+        colorize(_RULE, color),
 
-    print(f"\n  Per-Message Cost: ${costs['per_message_cost']:.4f}")
+        f"\n  Configuration:",
+        f"    Model:          {costs['model'].upper()}",
+        f"    Heartbeat:      {costs['heartbeat_model'].upper()}",
+        f"    Caching:        {caching}",
+        f"    Context:        {costs['context_tokens']:,.0f} tokens ({costs['context_tokens']/250:.1f}KB)",
 
-    print(f"\n  Daily Costs:")
-    print(f"    Messages (100): ${costs['daily_message_cost']:.2f}")
-    print(f"    Heartbeats:     ${costs['daily_heartbeat_cost']:.2f}")
-    print(colorize(f"    TOTAL:          ${costs['daily_total']:.2f}", Colors.BOLD))
+        f"\n  Per-Message Cost: ${costs['per_message_cost']:.4f}",
 
-    print(f"\n  Projected Costs:")
-    print(colorize(f"    Monthly:        ${costs['monthly_total']:.2f}", Colors.BOLD))
-    print(colorize(f"    Yearly:         ${costs['yearly_total']:.2f}", Colors.BOLD))
+        f"\n  Daily Costs:",
+        f"    Messages (100): ${costs['daily_message_cost']:.2f}",
+        f"    Heartbeats:     ${costs['daily_heartbeat_cost']:.2f} (${costs['daily_heartbeat_batch_cost']:.2f} if batched)",
+        colorize(f"    TOTAL:          ${costs['daily_total']:.2f}", Colors.BOLD),
 
-def run_simulation():
-    """Run the full simulation test."""
-
-    print(colorize("""
-+---------------------------------------------------------------+
-|                                                               |
-|   TOKEN OPTIMIZER - SIMULATION TEST                           |
-|                                                               |
-|   Demonstrates before/after performance comparison            |
-|                                                               |
-+---------------------------------------------------------------+
-    """, Colors.BOLD + Colors.CYAN))
+        f"\n  Projected Costs:",
+        colorize(f"    Monthly:        ${costs['monthly_total']:.2f}", Colors.BOLD),
+        colorize(f"    Yearly:         ${costs['yearly_total']:.2f}", Colors.BOLD),
+    ]
+    sys.stdout.write("\n".join(out) + "\n")
 
-    # Setup test directory
-    test_dir = Path(__file__).parent / 'mock_environment'
-    if test_dir.exists():
-        shutil.rmtree(test_dir)
-    test_dir.mkdir(parents=True)
+def simulate(test_dir: Path):
+    """Run the before/after comparison inside test_dir."""
 
     # Create mock environment
-    openclaw_dir = create_mock_environment(test_dir)
+    openclaw_dir, before_config = create_mock_environment(test_dir)
 
     # ========== BEFORE OPTIMIZATION ==========
 
-    print(colorize("\n\n" + "="*60, Colors.RED))
+    print(colorize("\n\n" + _RULE, Colors.RED))
     print(colorize("  PHASE 1: BEFORE OPTIMIZATION (Typical Default Setup)", Colors.BOLD + Colors.RED))
-    print(colorize("="*60, Colors.RED))
-
-    # Load unoptimized config
-    with open(openclaw_dir / 'openclaw.json') as f:
-        before_config = json.load(f)
+    print(colorize(_RULE, Colors.RED))
 
     # Calculate workspace size
     workspace_dir = openclaw_dir / 'workspace'
-    before_workspace_size = sum(f.stat().st_size for f in workspace_dir.iterdir() if f.is_file()) / 1024
+    with os.scandir(workspace_dir) as entries:
+        before_workspace_size = sum(e.stat().st_size for e in entries if e.is_file()) / 1024
 
     print(f"\n  Workspace size: {before_workspace_size:.1f}KB")
     print(f"  Files loaded every message: SOUL.md, MEMORY.md, USER.md")
@@ -251,9 +255,9 @@ def run_simulation():
 
     # ========== APPLY OPTIMIZATION ==========
 
-    print(colorize("\n\n" + "="*60, Colors.YELLOW))
+    print(colorize("\n\n" + _RULE, Colors.YELLOW))
     print(colorize("  PHASE 2: APPLYING TOKEN OPTIMIZER", Colors.BOLD + Colors.YELLOW))
-    print(colorize("="*60, Colors.YELLOW))
+    print(colorize(_RULE, Colors.YELLOW))
 
     # Create optimized config
     optimized_config = {
@@ -290,8 +294,7 @@ def run_simulation():
     }
 
     # Save optimized config
-    with open(openclaw_dir / 'openclaw.json', 'w') as f:
-        json.dump(optimized_config, f, indent=2)
+    (openclaw_dir / 'openclaw.json').write_text(jsonio.dumps(optimized_config))
 
     print("\n  Optimizations applied:")
     print(colorize("    [OK] Model routing: Haiku default (92% cheaper)", Colors.GREEN))
@@ -324,12 +327,13 @@ def run_simulation():
 
     # ========== AFTER OPTIMIZATION ==========
 
-    print(colorize("\n\n" + "="*60, Colors.GREEN))
+    print(colorize("\n\n" + _RULE, Colors.GREEN))
     print(colorize("  PHASE 3: AFTER OPTIMIZATION", Colors.BOLD + Colors.GREEN))
-    print(colorize("="*60, Colors.GREEN))
+    print(colorize(_RULE, Colors.GREEN))
 
     # Calculate new workspace size
-    after_workspace_size = sum(f.stat().st_size for f in workspace_dir.iterdir() if f.is_file()) / 1024
+    with os.scandir(workspace_dir) as entries:
+        after_workspace_size = sum(e.stat().st_size for e in entries if e.is_file()) / 1024
 
     print(f"\n  Workspace size: {after_workspace_size:.1f}KB")
     print(f"  Files loaded: SOUL.md, USER.md only (lean)")
@@ -339,38 +343,54 @@ def run_simulation():
 
     # ========== COMPARISON ==========
 
-    print(colorize("\n\n" + "="*60, Colors.BOLD + Colors.CYAN))
-    print(colorize("  SAVINGS SUMMARY", Colors.BOLD + Colors.CYAN))
-    print(colorize("="*60, Colors.BOLD + Colors.CYAN))
-
     daily_savings = before_costs['daily_total'] - after_costs['daily_total']
     monthly_savings = before_costs['monthly_total'] - after_costs['monthly_total']
     yearly_savings = before_costs['yearly_total'] - after_costs['yearly_total']
 
     savings_percent = (1 - after_costs['monthly_total'] / before_costs['monthly_total']) * 100
+    model_savings = (COSTS['sonnet']['input'] - COSTS['haiku']['input']) / COSTS['sonnet']['input'] * 100
 
-    print(f"\n  {'Metric':<20} {'Before':>12} {'After':>12} {'Savings':>12}")
-    print(f"  {'-'*56}")
-    print(f"  {'Daily Cost':<20} ${before_costs['daily_total']:>10.2f} ${after_costs['daily_total']:>10.2f} {colorize(f'${daily_savings:>10.2f}', Colors.GREEN)}")
-    print(f"  {'Monthly Cost':<20} ${before_costs['monthly_total']:>10.2f} ${after_costs['monthly_total']:>10.2f} {colorize(f'${monthly_savings:>10.2f}', Colors.GREEN)}")
-    print(f"  {'Yearly Cost':<20} ${before_costs['yearly_total']:>10.2f} ${after_costs['yearly_total']:>10.2f} {colorize(f'${yearly_savings:>10.2f}', Colors.GREEN)}")
-
-    print(colorize(f"\n  +-------------------------------------------------------+", Colors.BOLD + Colors.GREEN))
-    print(colorize(f"  |  TOTAL SAVINGS: {savings_percent:.0f}%                                 |", Colors.BOLD + Colors.GREEN))
-    print(colorize(f"  |  ${monthly_savings:.2f}/month = ${yearly_savings:.2f}/year                    |", Colors.BOLD + Colors.GREEN))
-    print(colorize(f"  +-------------------------------------------------------+", Colors.BOLD + Colors.GREEN))
+    out = [
+        colorize("\n\n" + _RULE, Colors.BOLD + Colors.CYAN),
+        colorize("  SAVINGS SUMMARY", Colors.BOLD + Colors.CYAN),
+        colorize(_RULE, Colors.BOLD + Colors.CYAN),
+    ]
+    out.append(f"\n  {'Metric':<20} {'Before':>12} {'After':>12} {'Savings':>12}")
+    out.append(f"  {'-'*56}")
+    out.append(f"  {'Daily Cost':<20} ${before_costs['daily_total']:>10.2f} ${after_costs['daily_total']:>10.2f} {colorize(f'${daily_savings:>10.2f}', Colors.GREEN)}")
+    out.append(f"  {'Monthly Cost':<20} ${before_costs['monthly_total']:>10.2f} ${after_costs['monthly_total']:>10.2f} {colorize(f'${monthly_savings:>10.2f}', Colors.GREEN)}")
+    out.append(f"  {'Yearly Cost':<20} ${before_costs['yearly_total']:>10.2f} ${after_costs['yearly_total']:>10.2f} {colorize(f'${yearly_savings:>10.2f}', Colors.GREEN)}")
+
+    out.append(colorize(f"\n  +-------------------------------------------------------+", Colors.BOLD + Colors.GREEN))
+    out.append(colorize(f"  |  TOTAL SAVINGS: {savings_percent:.0f}%                                 |", Colors.BOLD + Colors.GREEN))
+    out.append(colorize(f"  |  ${monthly_savings:.2f}/month = ${yearly_savings:.2f}/year                    |", Colors.BOLD + Colors.GREEN))
+    out.append(colorize(f"  +-------------------------------------------------------+", Colors.BOLD + Colors.GREEN))
 
     # Breakdown
-    print(colorize("\n  Savings Breakdown:", Colors.BOLD))
+    out.append(colorize("\n  Savings Breakdown:", Colors.BOLD))
+    out.append(f"    - Model Routing (Sonnet->Haiku):     {model_savings:.0f}% per token")
+    out.append(f"    - Heartbeat (Paid->Ollama):          100% (free)")
+    out.append(f"    - Context Reduction (50KB->2KB):     96% less tokens")
+    out.append(f"    - Prompt Caching:                   90% on repeated content")
+    out.append(f"    - Batch API (paid heartbeats):      {BATCH_DISCOUNT:.0%} if not moved to Ollama")
+    sys.stdout.write("\n".join(out) + "\n")
 
-    model_savings = (COSTS['sonnet']['input'] - COSTS['haiku']['input']) / COSTS['sonnet']['input'] * 100
-    print(f"    - Model Routing (Sonnet->Haiku):     {model_savings:.0f}% per token")
-    print(f"    - Heartbeat (Paid->Ollama):          100% (free)")
-    print(f"    - Context Reduction (50KB->2KB):     96% less tokens")
-    print(f"    - Prompt Caching:                   90% on repeated content")
+def run_simulation():
+    """Run the full simulation test."""
+
+    print(colorize("""
++---------------------------------------------------------------+
+|                                                               |
+|   TOKEN OPTIMIZER - SIMULATION TEST                           |
+|                                                               |
+|   Demonstrates before/after performance comparison            |
+|                                                               |
++---------------------------------------------------------------+
+    """, Colors.BOLD + Colors.CYAN))
 
-    # Cleanup
-    shutil.rmtree(test_dir)
+    # Mock environment lives in a temporary directory that is removed on exit
+    with tempfile.TemporaryDirectory(prefix='openclaw_sim_') as tmp:
+        simulate(Path(tmp))
 
     print(colorize("\n\n[OK] Simulation complete! Mock environment cleaned up.", Colors.GREEN))
     print(colorize("\nTo apply these optimizations to your real OpenClaw setup:", Colors.CYAN))